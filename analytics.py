@@ -0,0 +1,159 @@
+"""
+Report counts over time, served from incrementally maintained rollups.
+
+Every report is counted once into a base rollup: a 5-minute time bucket and
+the (county, issue_type, status) of the report. New reports committed by this
+process are added to it as they arrive (through DataStore.subscribe); it is
+only rebuilt when the reports or polling places are re-read from disk.
+Queries for coarser intervals or fewer group-by fields sum base cells, whose
+number is bounded by buckets x counties x issue types x statuses, however
+many reports there are. Results are also memoized per data version, so a
+wall of dashboards polling the same view costs one computation per change.
+"""
+
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+import ids
+from store import DerivedView
+
+
+BASE_MINUTES = 5
+BUCKET_MS = BASE_MINUTES * 60 * 1000
+
+# Supported bucket sizes, all multiples of the base bucket
+INTERVALS = (5, 10, 15, 20, 30, 60)
+
+GROUP_FIELDS = ('county', 'issue_type', 'status')
+
+UNKNOWN_COUNTY = 'Unknown'
+
+# Memoized query results kept per process
+MAX_RESULTS = 128
+
+
+def bucket_start(bucket, interval_minutes=BASE_MINUTES):
+    """ISO timestamp for the start of a bucket of interval_minutes."""
+    ms = bucket * interval_minutes * 60 * 1000
+    return datetime.fromtimestamp(ms / 1000, timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+class ReportRollups(DerivedView):
+    """
+    Report counts by 5-minute bucket, county, issue type and status.
+
+    The state is {base bucket: {(county, issue_type, status): count}}.
+    """
+
+    def __init__(self, store):
+        super().__init__(store)
+        self._results = OrderedDict()
+
+    def _county_lookup(self, places):
+        counties = places['county']
+        cache = {}
+
+        def county_of(polling_place_id):
+            county = cache.get(polling_place_id)
+            if county is None:
+                row = places.row_of(polling_place_id)
+                county = cache[polling_place_id] = UNKNOWN_COUNTY if row is None else counties[row]
+            return county
+
+        return county_of
+
+    def changed(self):
+        # Results are memoized per data version, so older ones are dead
+        self._results.clear()
+
+    def build(self, places, reports):
+        cells = {}
+        self.add(cells, places, reports)
+        return cells
+
+    def add(self, cells, places, reports):
+        county_of = self._county_lookup(places)
+        for report in reports:
+            bucket = ids.timestamp_ms(report['timestamp']) // BUCKET_MS
+            key = (county_of(report['polling_place_id']), report.get('issue_type', ''), report.get('status', ''))
+            bucket_cells = cells.get(bucket)
+            if bucket_cells is None:
+                bucket_cells = cells[bucket] = {}
+            bucket_cells[key] = bucket_cells.get(key, 0) + 1
+
+    def counts(self, interval_minutes=15, group_by=(), filters=None, start_ms=None, end_ms=None):
+        """
+        Report counts per time bucket.
+
+        Buckets are interval_minutes long (one of INTERVALS) and split by the
+        fields in group_by (a subset of GROUP_FIELDS). filters maps fields to
+        sets of allowed values; the time range includes start_ms and excludes
+        end_ms, rounded out to whole 5-minute buckets. Only buckets with
+        reports are returned, in time order.
+        """
+        if interval_minutes not in INTERVALS:
+            raise ValueError(f'interval must be one of {INTERVALS}')
+        unknown = [field for field in group_by if field not in GROUP_FIELDS]
+        if unknown:
+            raise ValueError(f'cannot group by {", ".join(unknown)}')
+        filters = {field: values for field, values in (filters or {}).items() if values}
+        group_by = tuple(field for field in GROUP_FIELDS if field in group_by)
+
+        self.store.refresh()
+        memo_key = (
+            self.store.version, interval_minutes, group_by,
+            tuple(sorted((field, tuple(sorted(values))) for field, values in filters.items())),
+            start_ms, end_ms,
+        )
+        with self._lock:
+            cells = self._current()
+            result = self._results.get(memo_key)
+            if result is not None:
+                self._results.move_to_end(memo_key)
+                return result
+            # Snapshot the buckets in range while nothing can add to them
+            first = None if start_ms is None else start_ms // BUCKET_MS
+            last = None if end_ms is None else -(-end_ms // BUCKET_MS)
+            selected = [
+                (bucket, tuple(bucket_cells.items()))
+                for bucket, bucket_cells in cells.items()
+                if (first is None or bucket >= first) and (last is None or bucket < last)
+            ]
+
+        result = self._aggregate(selected, interval_minutes, group_by, filters)
+        with self._lock:
+            self._results[memo_key] = result
+            while len(self._results) > MAX_RESULTS:
+                self._results.popitem(last=False)
+        return result
+
+    def _aggregate(self, selected, interval_minutes, group_by, filters):
+        positions = [GROUP_FIELDS.index(field) for field in group_by]
+        checks = [(GROUP_FIELDS.index(field), values) for field, values in filters.items()]
+        per_bucket = interval_minutes // BASE_MINUTES
+
+        buckets = {}
+        for base_bucket, items in selected:
+            groups = buckets.setdefault(base_bucket // per_bucket, {})
+            if checks:
+                items = [(key, count) for key, count in items if all(key[i] in values for i, values in checks)]
+            if not positions:
+                groups[()] = groups.get((), 0) + sum(count for _, count in items)
+                continue
+            for key, count in items:
+                group = tuple([key[i] for i in positions])
+                groups[group] = groups.get(group, 0) + count
+
+        result = []
+        for bucket in sorted(buckets):
+            groups = buckets[bucket]
+            if not groups:
+                continue
+            entry = {'start': bucket_start(bucket, interval_minutes), 'total': sum(groups.values())}
+            if group_by:
+                entry['groups'] = [
+                    dict(zip(group_by, group), count=count)
+                    for group, count in sorted(groups.items(), key=lambda item: (-item[1], item[0]))
+                ]
+            result.append(entry)
+        return result
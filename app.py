@@ -1,22 +1,79 @@
+import hashlib
 import os
-import json
 from datetime import datetime
 from flask import Flask, render_template, request, redirect, url_for, session, jsonify, flash
+from markupsafe import Markup
+
+import analytics
+import cache
+import exports
+import ids
+import ingest
+import metrics
+import profiling
+import summaries
+from places import SORT_FIELDS
+from store import DataStore
 
 app = Flask(__name__)
 app.secret_key = 'dev-secret-key-change-in-production'
+app.config['DATA_DIR'] = os.environ.get('DATA_DIR', 'data')
+app.config['LIST_CACHE_MAX_CHARS'] = int(os.environ.get('LIST_CACHE_MAX_CHARS', 64 * 1024 * 1024))
+
+# Matches returned by the place picker's search, by default and at most
+SEARCH_LIMIT = 10
+MAX_SEARCH_LIMIT = 50
+metrics.init_app(app)
+profiling.init_app(app)
+
+# Data is parsed once and shared by all requests (and, with gunicorn's
+# preload_app, by all workers); see store.py
+store = DataStore(app)
+
+# Submitted reports are committed in batches by a background writer; see ingest.py
+ingest_queue = ingest.IngestQueue(store, app)
+
+# Report counts over time, kept up to date as reports are committed
+rollups = analytics.ReportRollups(store)
+
+# County and state totals, kept up to date the same way
+county_summaries = summaries.Summaries(store)
+
+# Rendered polling_places_list results by filter; a new report only evicts
+# the lists its polling place appears in
+list_cache = cache.FragmentCache('polling_places_list', max_chars=app.config['LIST_CACHE_MAX_CHARS'])
+
+
+def evict_list_pages(added):
+    if added is None:
+        list_cache.clear()
+        return
+    places = store.places
+    counties, risks = places['county'], places['risk_score']
+    changed = set()
+    for report in added:
+        row = places.row_of(report['polling_place_id'])
+        if row is not None:
+            changed.add((counties[row], risks[row]))
+
+    def shows_changed_place(key):
+        _, county_filter, risk_min, risk_max, _, _ = key
+        return any((not county_filter or county_filter == county) and risk_min <= risk <= risk_max
+                   for county, risk in changed)
+
+    if changed:
+        list_cache.evict(shows_changed_place)
+
+
+store.subscribe(evict_list_pages)
 
-# Load data from JSON files
 def load_data():
-    with open('data/polling_places.json', 'r') as f:
-        polling_places = json.load(f)
-    with open('data/reports.json', 'r') as f:
-        reports = json.load(f)
-    return polling_places, reports
+    with metrics.phase('load'):
+        return store.get()
 
 def save_reports(reports):
-    with open('data/reports.json', 'w') as f:
-        json.dump(reports, f, indent=2)
+    with metrics.phase('save'):
+        store.save_reports(reports)
 
 # Mock authentication
 MOCK_USERS = {
@@ -63,76 +120,95 @@ def logout():
     return redirect(url_for('login'))
 
 
-@app.route('/polling-places')
-@login_required
-def polling_places_list():
-    polling_places, reports = load_data()
-
-    # Get filter parameters
+def list_filters():
+    """The polling place filters from the query string: county, risk range, sort and order"""
     county_filter = request.args.get('county', '')
     risk_min = request.args.get('risk_min', 0, type=int)
     risk_max = request.args.get('risk_max', 100, type=int)
     sort_by = request.args.get('sort', 'risk_score')
     sort_order = request.args.get('order', 'desc')
+    return county_filter, risk_min, risk_max, sort_by, sort_order
 
-    # Filter polling places
-    filtered_places = polling_places
-
-    if county_filter:
-        filtered_places = [p for p in filtered_places if p['county'] == county_filter]
-
-    filtered_places = [p for p in filtered_places if risk_min <= p['risk_score'] <= risk_max]
-
-    # Sort polling places
-    reverse = (sort_order == 'desc')
-    if sort_by in ['risk_score', 'total_voters', 'multi_state_registrations', 'recent_registrations', 'purged_voters']:
-        filtered_places.sort(key=lambda x: x[sort_by], reverse=reverse)
-    elif sort_by == 'name':
-        filtered_places.sort(key=lambda x: x['name'], reverse=reverse)
-    elif sort_by == 'county':
-        filtered_places.sort(key=lambda x: x['county'], reverse=reverse)
 
-    # Count reports for each polling place
-    report_counts = {}
-    for report in reports:
-        pp_id = report['polling_place_id']
-        report_counts[pp_id] = report_counts.get(pp_id, 0) + 1
-
-    # Add report counts to polling places
-    for place in filtered_places:
-        place['report_count'] = report_counts.get(place['id'], 0)
-
-    # Get unique counties for filter dropdown
-    counties = sorted(set(p['county'] for p in polling_places))
+@app.route('/polling-places')
+@login_required
+def polling_places_list():
+    places, reports = load_data()
 
-    return render_template('polling_places_list.html',
-                         polling_places=filtered_places,
-                         counties=counties,
-                         current_county=county_filter,
-                         current_risk_min=risk_min,
-                         current_risk_max=risk_max,
-                         current_sort=sort_by,
-                         current_order=sort_order)
+    # Get filter parameters
+    county_filter, risk_min, risk_max, sort_by, sort_order = list_filters()
+
+    # The results table only depends on these (and the data), so it is
+    # cached; the rest of the page has the user's name and flash messages
+    places_version = store.version[0]
+    key = (places_version, county_filter, risk_min, risk_max,
+           sort_by if sort_by in SORT_FIELDS else '', sort_order == 'desc')
+    results = list_cache.get(key)
+    if results is None:
+        generation = list_cache.generation
+        # Filter and sort on the place columns (see places.PlaceTable.query)
+        with metrics.phase('filter'):
+            rows = places.query(county_filter, risk_min, risk_max, sort_by, reverse=(sort_order == 'desc'))
+
+        # Timed apart from the page render, so each phase is observed once per request
+        with metrics.phase('render_results'):
+            results = render_template('_polling_places_results.html',
+                                    polling_places=places.rows(rows),
+                                    report_counts=store.report_counts)
+        list_cache.put(key, results, generation)
+
+    with metrics.phase('render'):
+        return render_template('polling_places_list.html',
+                             results=Markup(results),
+                             counties=store.counties,
+                             current_county=county_filter,
+                             current_risk_min=risk_min,
+                             current_risk_max=risk_max,
+                             current_sort=sort_by,
+                             current_order=sort_order)
 
 
 @app.route('/polling-places/<place_id>')
 @login_required
 def polling_place_detail(place_id):
-    polling_places, reports = load_data()
+    # Taken before loading so a report committed in between is not missed
+    pending = ingest_queue.pending(place_id)
+    # The user's own submissions here, queued by another worker, are waited for
+    ingest.await_remembered(ingest_queue, place_id)
+    places, reports = load_data()
 
     # Find the polling place
-    place = next((p for p in polling_places if p['id'] == place_id), None)
+    place = places.get(place_id)
     if not place:
         flash('Polling place not found', 'error')
         return redirect(url_for('polling_places_list'))
 
     # Get reports for this polling place
-    place_reports = [r for r in reports if r['polling_place_id'] == place_id]
-    place_reports.sort(key=lambda x: x['timestamp'], reverse=True)
+    with metrics.phase('filter'):
+        place_reports = [r for r in reports if r['polling_place_id'] == place_id]
+        # Reports in this worker's queue that are not committed yet
+        shown = {r['id'] for r in place_reports}
+        place_reports.extend(r for r in pending if r['id'] not in shown)
+    with metrics.phase('sort'):
+        place_reports.sort(key=ids.report_order_key, reverse=True)
+
+    with metrics.phase('render'):
+        return render_template('polling_place_detail.html',
+                             place=place,
+                             reports=place_reports)
+
+
+@app.route('/counties')
+@login_required
+def county_summary():
+    with metrics.phase('aggregate'):
+        states = county_summaries.rows('state')
+        counties = county_summaries.rows('county')
 
-    return render_template('polling_place_detail.html',
-                         place=place,
-                         reports=place_reports)
+    with metrics.phase('render'):
+        return render_template('counties.html',
+                             states=states.values(),
+                             counties=counties.values())
 
 
 @app.route('/map')
@@ -144,61 +220,207 @@ def map_view():
 @app.route('/report', methods=['GET', 'POST'])
 @login_required
 def submit_report():
-    polling_places, reports = load_data()
+    places, reports = load_data()
 
     if request.method == 'POST':
-        # Generate new report ID
-        report_id = f"rpt-{len(reports) + 1:03d}"
+        fields, errors = ingest.validate_report(request.form, places)
+        if errors:
+            for error in errors:
+                flash(error, 'error')
+            return render_template('report_form.html',
+                                 fields=fields,
+                                 preselected_place=places.get(fields['polling_place_id'])), 400
 
         new_report = {
-            'id': report_id,
-            'polling_place_id': request.form.get('polling_place_id'),
-            'reporter_name': request.form.get('reporter_name'),
-            'reporter_email': request.form.get('reporter_email'),
-            'reporter_phone': request.form.get('reporter_phone', ''),
-            'issue_type': request.form.get('issue_type'),
-            'description': request.form.get('description'),
+            'id': ids.new_report_id(),
+            'polling_place_id': fields['polling_place_id'],
+            'reporter_name': fields['reporter_name'],
+            'reporter_email': fields['reporter_email'],
+            'reporter_phone': fields['reporter_phone'],
+            'issue_type': fields['issue_type'],
+            'description': fields['description'],
             'timestamp': datetime.utcnow().isoformat() + 'Z',
             'status': 'reported'
         }
 
-        reports.append(new_report)
-        save_reports(reports)
+        # Queued for the background writer; the ID kept in the session lets
+        # the detail page wait for it to be committed
+        try:
+            with metrics.phase('save'):
+                ingest_queue.submit(new_report)
+        except OSError:
+            # Only when the queue was full and committing it here failed
+            app.logger.exception('Could not save report %s', new_report['id'])
+            flash('Your report could not be saved. Please try again.', 'error')
+            return render_template('report_form.html',
+                                 fields=fields,
+                                 preselected_place=places.get(fields['polling_place_id'])), 503
+        ingest.remember(new_report)
+        metrics.REPORTS_SUBMITTED.inc()
 
         flash('Report submitted successfully!', 'success')
         return redirect(url_for('polling_place_detail', place_id=new_report['polling_place_id']))
 
-    # GET request - show form
-    preselected_place_id = request.args.get('polling_place_id', '')
-    return render_template('report_form.html',
-                         polling_places=polling_places,
-                         preselected_place_id=preselected_place_id)
+    # GET request - show form. Places are picked through
+    # /api/polling-places/search, so the page does not list them
+    preselected_place = places.get(request.args.get('polling_place_id', ''))
+    with metrics.phase('render'):
+        return render_template('report_form.html',
+                             preselected_place=preselected_place)
 
 
 # API endpoints for map
 @app.route('/api/polling-places')
 @login_required
 def api_polling_places():
-    polling_places, reports = load_data()
+    places, reports = load_data()
 
-    # Count reports for each polling place
-    report_counts = {}
-    for report in reports:
-        pp_id = report['polling_place_id']
-        report_counts[pp_id] = report_counts.get(pp_id, 0) + 1
+    with metrics.phase('aggregate'):
+        # Add report counts to plain dicts built from the place columns
+        report_counts = store.report_counts
+        polling_places = places.records(
+            report_count=[report_counts.get(place_id, 0) for place_id in places['id']]
+        )
 
-    # Add report counts
-    for place in polling_places:
-        place['report_count'] = report_counts.get(place['id'], 0)
+    with metrics.phase('serialize'):
+        return jsonify(polling_places)
 
-    return jsonify(polling_places)
+
+@app.route('/api/polling-places/search')
+@login_required
+def api_search_polling_places():
+    """Polling places whose name, city or county words start with ?q=, for the report form"""
+    places, _ = load_data()
+    try:
+        limit = min(max(int(request.args.get('limit', SEARCH_LIMIT)), 1), MAX_SEARCH_LIMIT)
+    except ValueError:
+        return jsonify({'error': 'limit must be a number'}), 400
+
+    with metrics.phase('filter'):
+        rows = places.search(request.args.get('q', ''), limit)
+    with metrics.phase('serialize'):
+        return jsonify([
+            {field: places.value(field, row) for field in ('id', 'name', 'address', 'city', 'county')}
+            for row in rows
+        ])
 
 
 @app.route('/api/reports')
 @login_required
 def api_reports():
-    _, reports = load_data()
-    return jsonify(reports)
+    # ?since=<report id> returns only the reports committed after it
+    since = request.args.get('since')
+    if since:
+        with metrics.phase('load'):
+            reports = store.reports_since(since)
+    else:
+        _, reports = load_data()
+    with metrics.phase('serialize'):
+        return jsonify(reports)
+
+
+@app.route('/api/summary')
+@login_required
+def api_summary():
+    """Precomputed totals for every county or state, or for one with ?name="""
+    level = request.args.get('level', 'county')
+    if level not in summaries.LEVELS:
+        return jsonify({'error': f'level must be one of {", ".join(summaries.LEVELS)}'}), 400
+    with metrics.phase('aggregate'):
+        rows = county_summaries.rows(level)
+
+    name = request.args.get('name')
+    if name:
+        if name not in rows:
+            return jsonify({'error': f'Unknown {level}: {name}'}), 404
+        return jsonify(rows[name])
+    with metrics.phase('serialize'):
+        return jsonify(list(rows.values()))
+
+
+@app.route('/api/analytics/reports')
+@login_required
+def api_report_analytics():
+    """Report counts per time bucket, optionally grouped by county, issue type and status"""
+    interval = request.args.get('interval', 15, type=int)
+    group_by = [field for field in request.args.get('group_by', '').split(',') if field]
+    try:
+        start_ms = exports.parse_time(request.args.get('start'))
+        end_ms = exports.parse_time(request.args.get('end'))
+    except ValueError:
+        return jsonify({'error': 'start and end must be ISO dates or timestamps'}), 400
+
+    # Dashboards poll this; unchanged data answers 304 without recomputing
+    store.refresh()
+    # (hash() is salted per process, so it would differ between workers)
+    etag = hashlib.blake2b(repr((store.version, request.query_string)).encode(), digest_size=8).hexdigest()
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        with metrics.phase('aggregate'):
+            try:
+                buckets = rollups.counts(
+                    interval_minutes=interval,
+                    group_by=group_by,
+                    filters={field: set(request.args.getlist(field)) for field in analytics.GROUP_FIELDS},
+                    start_ms=start_ms,
+                    end_ms=end_ms,
+                )
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+        with metrics.phase('serialize'):
+            response = jsonify({
+                'interval_minutes': interval,
+                'group_by': [field for field in analytics.GROUP_FIELDS if field in group_by],
+                'buckets': buckets,
+            })
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+# Streaming downloads
+@app.route('/export/polling-places')
+@login_required
+def export_polling_places():
+    """Polling places matching the list filters, as CSV or JSON lines"""
+    fmt = request.args.get('format', 'csv')
+    if fmt not in exports.FORMATS:
+        return jsonify({'error': f'Unknown format: {fmt}'}), 400
+    places, _ = load_data()
+    county_filter, risk_min, risk_max, sort_by, sort_order = list_filters()
+
+    with metrics.phase('filter'):
+        rows = places.query(county_filter, risk_min, risk_max, sort_by, reverse=(sort_order == 'desc'))
+
+    rows = exports.place_rows(places, rows, store.report_counts)
+    return exports.streaming_response(exports.PLACE_FIELDS, rows, fmt, 'polling_places')
+
+
+@app.route('/export/reports')
+@login_required
+def export_reports():
+    """Reports in ID order, filtered by status, issue type and time range, as CSV or JSON lines"""
+    fmt = request.args.get('format', 'csv')
+    if fmt not in exports.FORMATS:
+        return jsonify({'error': f'Unknown format: {fmt}'}), 400
+    try:
+        start_ms = exports.parse_time(request.args.get('start'))
+        end_ms = exports.parse_time(request.args.get('end'))
+    except ValueError:
+        return jsonify({'error': 'start and end must be ISO dates or timestamps'}), 400
+
+    with metrics.phase('load'):
+        reports, _ = store.report_order()
+
+    rows = exports.report_rows(
+        reports,
+        statuses=set(request.args.getlist('status')),
+        issue_types=set(request.args.getlist('issue_type')),
+        start_ms=start_ms,
+        end_ms=end_ms,
+    )
+    return exports.streaming_response(exports.REPORT_FIELDS, rows, fmt, 'reports')
 
 
 @app.route('/health')
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Check the import-time budget of the app and the command-line tools.
+
+Each target is started in a fresh interpreter with `python -X importtime`,
+and the cumulative import time of everything it loads beyond a bare
+interpreter is compared against a budget. Targets also list modules they
+must not import at all (the web app has no use for pandas or requests, and
+`--help` should not pay for numpy), which catches a stray top-level import
+long before it shows up as a slow cold start.
+
+Examples:
+    python benchmarks/check_startup.py
+
+    # Looser budgets on a slow machine, more runs to smooth out noise
+    python benchmarks/check_startup.py --scale 2 --runs 5
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_TOOLS = ["pandas", "numpy", "requests", "geopy", "openpyxl"]
+
+# (name, interpreter arguments, budget in ms, modules that must not be imported)
+TARGETS = [
+    ("import app", ["-c", "import app"], 300, HEAVY_TOOLS + ["cProfile", "pstats", "argparse"]),
+    ("scrape_polling_places.py --help", ["scrape_polling_places.py", "--help"], 50, HEAVY_TOOLS),
+    ("generate_data.py --help", ["generate_data.py", "--help"], 50, HEAVY_TOOLS),
+    ("generate_reports.py --help", ["generate_reports.py", "--help"], 50, HEAVY_TOOLS),
+    ("simulate_election_day.py --help", ["simulate_election_day.py", "--help"], 50, HEAVY_TOOLS),
+    ("snapshot.py --help", ["snapshot.py", "--help"], 50, HEAVY_TOOLS + ["flask"]),
+]
+
+
+def import_times(args):
+    """
+    Run the interpreter with -X importtime and parse its report.
+
+    Returns {module: (depth, cumulative microseconds)} for every module
+    imported, where depth 0 marks imports made directly by the target.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", *args],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"{' '.join(args)} exited with {result.returncode}:\n{result.stderr[-2000:]}")
+
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|", 2)
+        if not cumulative.strip().isdigit():
+            continue  # The column header
+        depth = (len(name) - len(name.lstrip())) // 2
+        modules[name.strip()] = (depth, int(cumulative))
+    return modules
+
+
+def check(name, args, budget_ms, forbidden, baseline, runs=3):
+    """Best-of-`runs` import time for a target, and any forbidden imports."""
+    best = None
+    imported = set()
+    for _ in range(runs):
+        modules = import_times(args)
+        imported |= set(modules)
+        total = sum(us for module, (depth, us) in modules.items() if depth == 0 and module not in baseline)
+        best = total if best is None else min(best, total)
+    return {
+        "name": name,
+        "ms": best / 1000,
+        "budget_ms": budget_ms,
+        "forbidden": sorted(module for module in imported if module.split(".")[0] in forbidden),
+    }
+
+
+def main():
+    """CLI interface for the startup check."""
+    parser = argparse.ArgumentParser(description="Check import-time budgets for the app and CLIs")
+    parser.add_argument("--runs", type=int, default=3, help="Runs per target; the fastest one counts")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiply every budget by this factor")
+    args = parser.parse_args()
+
+    # Whatever a bare interpreter loads (site, encodings, ...) is not ours
+    baseline = set(import_times(["-c", "pass"]))
+
+    failures = 0
+    for name, target_args, budget_ms, forbidden in TARGETS:
+        result = check(name, target_args, budget_ms * args.scale, forbidden, baseline, runs=args.runs)
+        problems = []
+        if result["ms"] > result["budget_ms"]:
+            problems.append(f"over budget of {result['budget_ms']:.0f} ms")
+        if result["forbidden"]:
+            problems.append(f"imports {', '.join(result['forbidden'])}")
+        status = "FAIL " + "; ".join(problems) if problems else "ok"
+        print(f"  {name:<36} {result['ms']:>8.1f} ms  {status}")
+        failures += bool(problems)
+
+    if failures:
+        print(f"\n{failures} target(s) failed the startup budget.")
+        sys.exit(1)
+    print("\nAll targets within their startup budget.")
+
+
+if __name__ == "__main__":
+    main()
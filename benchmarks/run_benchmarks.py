@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+Benchmark the app's routes and data layer across dataset sizes.
+
+Datasets are generated with the vectorized generators from generate_data.py
+and generate_reports.py into a temporary directory, and every route is driven
+through Flask's test client, so no server or network is needed. Results are
+written as JSON and can be compared against a stored baseline to catch
+regressions.
+
+Examples:
+    # Record a baseline on this machine
+    python benchmarks/run_benchmarks.py --save-baseline
+
+    # Compare the current tree against it (exits 1 on regression)
+    python benchmarks/run_benchmarks.py --output benchmarks/results.json
+
+    # Only the small dataset, fewer list combinations
+    python benchmarks/run_benchmarks.py --sizes 1000 --quick
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import snapshot  # noqa: E402
+from generate_data import generate_dataset_chunks  # noqa: E402
+from generate_reports import generate_reports_chunks  # noqa: E402
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+
+# Same density as the committed mock data: 75 reports per 1000 places
+REPORTS_PER_PLACE = 0.075
+
+SORT_KEYS = [
+    "risk_score", "total_voters", "multi_state_registrations",
+    "recent_registrations", "purged_voters", "name", "county",
+]
+SORT_ORDERS = ["desc", "asc"]
+RISK_RANGES = [(0, 100), (67, 100)]
+
+SAMPLE_REPORT = {
+    "reporter_name": "Bench Mark",
+    "reporter_email": "bench@example.com",
+    "reporter_phone": "703-555-0100",
+    "issue_type": "Long lines",
+    "description": "Benchmark submission.",
+}
+
+
+def build_dataset(directory, size, seed=0):
+    """Write polling_places.json and reports.json for `size` places."""
+    polling_places = [p for chunk in generate_dataset_chunks(size, seed=seed) for p in chunk]
+    place_ids = [p["id"] for p in polling_places]
+    reports = [
+        r
+        for chunk in generate_reports_chunks(max(1, int(size * REPORTS_PER_PLACE)), place_ids, seed=seed)
+        for r in chunk
+    ]
+    # Match the indented layout of the real data files
+    with open(os.path.join(directory, "polling_places.json"), "w") as f:
+        json.dump(polling_places, f, indent=2)
+    with open(os.path.join(directory, "reports.json"), "w") as f:
+        json.dump(reports, f, indent=2)
+    return polling_places, reports
+
+
+def measure(func, min_time=0.5, max_repeats=20, min_repeats=3):
+    """
+    Time `func` after one warm-up call.
+
+    Repeats until `min_time` seconds have been spent or `max_repeats` runs
+    are done, but always at least `min_repeats` times.
+    """
+    func()
+    timings = []
+    spent = 0.0
+    while len(timings) < min_repeats or (spent < min_time and len(timings) < max_repeats):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        timings.append(elapsed)
+        spent += elapsed
+    return {
+        "repeats": len(timings),
+        "min_ms": round(min(timings) * 1000, 3),
+        "median_ms": round(statistics.median(timings) * 1000, 3),
+        "mean_ms": round(statistics.fmean(timings) * 1000, 3),
+    }
+
+
+def checked_get(client, url):
+    """Return a callable that GETs `url` and fails loudly on a bad status."""
+    def run():
+        response = client.get(url)
+        if response.status_code != 200:
+            raise RuntimeError(f"GET {url} returned {response.status_code}")
+        # Read streamed responses to the end so the whole body is timed
+        response.get_data()
+    return run
+
+
+def uncached(app_module, func):
+    """Wrap `func` so every call starts with an empty list page cache."""
+    def run():
+        app_module.list_cache.clear()
+        func()
+    return run
+
+
+def list_cases(counties, quick=False):
+    """Query strings for polling_places_list filter and sort combinations."""
+    if quick:
+        combos = [(county, risk, sort, "desc") for county in counties for risk in RISK_RANGES for sort in ["risk_score"]]
+        combos += [("", RISK_RANGES[0], sort, order) for sort in SORT_KEYS for order in SORT_ORDERS]
+    else:
+        combos = itertools.product(counties, RISK_RANGES, SORT_KEYS, SORT_ORDERS)
+
+    cases = []
+    seen = set()
+    for county, (risk_min, risk_max), sort, order in combos:
+        query = f"risk_min={risk_min}&risk_max={risk_max}&sort={sort}&order={order}"
+        if county:
+            query = f"county={county.replace(' ', '+')}&{query}"
+        if query not in seen:
+            seen.add(query)
+            cases.append(query)
+    return cases
+
+
+def run_size(size, quick=False, seed=0):
+    """Run every benchmark case against a dataset of `size` places."""
+    import app as app_module
+
+    directory = tempfile.mkdtemp(prefix=f"ep-bench-{size}-")
+    try:
+        polling_places, reports = build_dataset(directory, size, seed=seed)
+        app_module.app.config["DATA_DIR"] = directory
+        app_module.app.config["TESTING"] = True
+        client = app_module.app.test_client()
+        with client.session_transaction() as session:
+            session["user"] = "admin"
+
+        reports_file = os.path.join(directory, "reports.json")
+        with open(reports_file, "rb") as f:
+            original_reports = f.read()
+
+        # Busiest county, so the county filter has real work to do
+        county_counts = {}
+        for p in polling_places:
+            county_counts[p["county"]] = county_counts.get(p["county"], 0) + 1
+        busiest_county = max(county_counts, key=county_counts.get)
+
+        results = {}
+
+        def record(name, func, **kwargs):
+            results[name] = measure(func, **kwargs)
+            print(f"  {size:>7} {name:<80} {results[name]['median_ms']:>10.3f} ms", flush=True)
+
+        # Cold load from disk; routes get the already-loaded copy
+        record("load_data", app_module.store.reload)
+
+        # The same cold load from a prebuilt binary snapshot
+        snapshot.build(directory)
+        record("load_snapshot", app_module.store.reload)
+        os.remove(os.path.join(directory, snapshot.SNAPSHOT_FILE))
+        app_module.store.reload()
+
+        _, loaded_reports = app_module.load_data()
+        record("save_reports", lambda: app_module.save_reports(loaded_reports))
+
+        # Rendering cost, so the rendered-results cache is emptied first
+        for query in list_cases(["", busiest_county], quick=quick):
+            record(f"polling_places_list?{query}", uncached(app_module, checked_get(client, f"/polling-places?{query}")),
+                   min_time=0.2, max_repeats=10)
+        record("polling_places_list cached", checked_get(client, "/polling-places"))
+
+        for place in (polling_places[0], polling_places[len(polling_places) // 2], polling_places[-1]):
+            record(f"polling_place_detail/{place['id']}", checked_get(client, f"/polling-places/{place['id']}"))
+
+        record("api_polling_places", checked_get(client, "/api/polling-places"))
+        record("api_reports", checked_get(client, "/api/reports"))
+        record("county_summary", checked_get(client, "/counties"))
+        record("api_summary", checked_get(client, "/api/summary"))
+        record("api_analytics_reports", checked_get(client, "/api/analytics/reports?interval=15&group_by=county,issue_type"))
+        record("submit_report GET", checked_get(client, "/report"))
+        record("api_search_polling_places", checked_get(client, "/api/polling-places/search?q=lincoln"))
+        record("export_polling_places csv", checked_get(client, "/export/polling-places"))
+        record("export_polling_places jsonl", checked_get(client, "/export/polling-places?format=jsonl"))
+        record("export_reports csv", checked_get(client, "/export/reports"))
+
+        form = dict(SAMPLE_REPORT, polling_place_id=polling_places[0]["id"])
+
+        def post_report():
+            response = client.post("/report", data=form)
+            if response.status_code != 302:
+                raise RuntimeError(f"POST /report returned {response.status_code}")
+
+        record("submit_report POST", post_report)
+        app_module.ingest_queue.flush()
+
+        # Leave the dataset as it was generated
+        with open(reports_file, "wb") as f:
+            f.write(original_reports)
+
+        return results
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def compare(results, baseline, threshold=0.25, noise_ms=1.0):
+    """
+    Compare median timings against a baseline.
+
+    A case regresses when it is more than `threshold` (fractional) slower and
+    the difference is above `noise_ms`. Returns a list of regression dicts.
+    """
+    regressions = []
+    for size, cases in results["results"].items():
+        base_cases = baseline.get("results", {}).get(size, {})
+        for name, timing in cases.items():
+            base = base_cases.get(name)
+            if not base:
+                continue
+            current = timing["median_ms"]
+            previous = base["median_ms"]
+            if current > previous * (1 + threshold) and current - previous > noise_ms:
+                regressions.append({
+                    "size": size,
+                    "case": name,
+                    "baseline_ms": previous,
+                    "current_ms": current,
+                    "ratio": round(current / previous, 2) if previous else None,
+                })
+    return regressions
+
+
+def main():
+    """CLI interface for the benchmark suite."""
+    parser = argparse.ArgumentParser(description="Benchmark routes and data-layer operations")
+    parser.add_argument(
+        "--sizes",
+        default=",".join(str(s) for s in DEFAULT_SIZES),
+        help="Comma-separated polling place counts"
+    )
+    parser.add_argument("--quick", action="store_true", help="Fewer polling_places_list combinations")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the generated datasets")
+    parser.add_argument("--output", help="Write results JSON to this file")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline results JSON to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed slowdown before flagging (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    results = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "sizes": sizes,
+            "quick": args.quick,
+            "seed": args.seed,
+        },
+        "results": {},
+    }
+
+    for size in sizes:
+        print(f"Dataset with {size} polling places:")
+        results["results"][str(size)] = run_size(size, quick=args.quick, seed=args.seed)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nSaved results to {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to create one.")
+        return
+
+    with open(args.baseline, "r") as f:
+        baseline = json.load(f)
+
+    regressions = compare(results, baseline, threshold=args.threshold)
+    if not regressions:
+        print("\nNo regressions against baseline.")
+        return
+
+    print(f"\n{len(regressions)} regression(s) against baseline:")
+    for r in regressions:
+        print(f"  {r['size']:>7} {r['case']:<80} {r['baseline_ms']:>10.3f} -> {r['current_ms']:.3f} ms ({r['ratio']}x)")
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Size-bounded LRU cache for rendered page fragments.
+
+Entries are evicted least recently used first once either the total length
+in characters of the cached strings or the number of entries goes over its
+limit, and
+callers can evict selectively with a predicate over the keys. Lookups count
+towards the ep_cache_hits_total / ep_cache_misses_total metrics under the
+cache's name.
+"""
+
+import threading
+from collections import OrderedDict
+
+import metrics
+
+
+class FragmentCache:
+    """LRU cache of strings, bounded by total characters and entry count."""
+
+    def __init__(self, name, max_chars=64 * 1024 * 1024, max_entries=256):
+        self.name = name
+        self.max_chars = max_chars
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._size = 0
+        # Bumped by every eviction, so a fragment rendered from data that
+        # changed meanwhile is not stored
+        self.generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+        if value is None:
+            metrics.CACHE_MISSES.inc(cache=self.name)
+        else:
+            metrics.CACHE_HITS.inc(cache=self.name)
+        return value
+
+    def put(self, key, value, generation=None):
+        """
+        Store value unless it is too big for the cache, or generation (read
+        before rendering it) shows an eviction happened in the meantime.
+        """
+        # A single entry may use at most a quarter of the budget
+        if len(value) * 4 > self.max_chars:
+            return
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._entries[key] = value
+            self._size += len(value)
+            while self._size > self.max_chars or len(self._entries) > self.max_entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def evict(self, predicate):
+        """Drop every entry whose key matches predicate(key)."""
+        with self._lock:
+            self.generation += 1
+            for key in [key for key in self._entries if predicate(key)]:
+                self._size -= len(self._entries.pop(key))
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            self._size = 0
+
+    def __len__(self):
+        return len(self._entries)
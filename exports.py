@@ -0,0 +1,126 @@
+"""
+Streaming CSV and JSON-lines exports of polling places and reports.
+
+Rows are encoded as they are produced and sent in chunks of ROWS_PER_CHUNK,
+so an export of every polling place in the state starts arriving right away
+and never exists in memory as a whole, unlike the /api endpoints which build
+one big JSON document.
+"""
+
+import csv
+import io
+import json
+
+from flask import Response, stream_with_context
+
+import ids
+from places import FIELDS
+
+
+# format name: (content type, file extension)
+FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'jsonl': ('application/x-ndjson', 'jsonl'),
+}
+
+PLACE_FIELDS = FIELDS + ('report_count',)
+
+REPORT_FIELDS = (
+    'id', 'polling_place_id', 'reporter_name', 'reporter_email', 'reporter_phone',
+    'issue_type', 'description', 'timestamp', 'status',
+)
+
+ROWS_PER_CHUNK = 500
+
+# Text starting with one of these is run as a formula by spreadsheet apps
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def csv_cell(value):
+    """
+    A value made safe to open in a spreadsheet: text that would be read as
+    a formula (CSV injection) gets a leading ' so it shows as typed.
+    """
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def encode_rows(field_names, rows, fmt):
+    """Yield `rows` (sequences of values) as CSV or JSON-lines text chunks."""
+    buffer = io.StringIO()
+    if fmt == 'csv':
+        writer = csv.writer(buffer)
+        writer.writerow(field_names)
+
+        def write(values):
+            # Reports carry free text typed in by volunteers
+            writer.writerow([csv_cell(value) for value in values])
+
+        # The header goes out before any row is produced
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    else:
+        def write(values):
+            buffer.write(json.dumps(dict(zip(field_names, values))))
+            buffer.write('\n')
+
+    pending = 0
+    for values in rows:
+        write(values)
+        pending += 1
+        if pending == ROWS_PER_CHUNK:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if pending:
+        yield buffer.getvalue()
+
+
+def streaming_response(field_names, rows, fmt, name):
+    """A download response streaming the rows in the given format."""
+    content_type, extension = FORMATS[fmt]
+    return Response(
+        stream_with_context(encode_rows(field_names, rows, fmt)),
+        content_type=content_type,
+        headers={'Content-Disposition': f'attachment; filename={name}.{extension}'},
+    )
+
+
+def place_rows(places, rows, report_counts):
+    """Values of PLACE_FIELDS for each row number, read straight from the columns."""
+    columns = [places[field] for field in FIELDS]
+    ids_column = places['id']
+    for row in rows:
+        values = [column[row] for column in columns]
+        values.append(report_counts.get(ids_column[row], 0))
+        yield values
+
+
+def parse_time(value):
+    """Milliseconds for an ISO date or timestamp query argument, or None if empty."""
+    if not value:
+        return None
+    return ids.timestamp_ms(value)
+
+
+def report_rows(reports, statuses=None, issue_types=None, start_ms=None, end_ms=None):
+    """
+    Values of REPORT_FIELDS for the reports that match every given filter.
+
+    statuses and issue_types are collections of allowed values; the time
+    range includes start_ms and excludes end_ms.
+    """
+    timed = start_ms is not None or end_ms is not None
+    for report in reports:
+        if statuses and report.get('status') not in statuses:
+            continue
+        if issue_types and report.get('issue_type') not in issue_types:
+            continue
+        if timed:
+            at = ids.timestamp_ms(report['timestamp'])
+            if (start_ms is not None and at < start_ms) or (end_ms is not None and at >= end_ms):
+                continue
+        yield [report.get(field, '') for field in REPORT_FIELDS]
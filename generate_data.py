@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 """Generate mock polling place data for Virginia"""
 
+import argparse
 import json
 import random
 
@@ -75,6 +76,11 @@ STREET_NAMES = [
 
 STREET_TYPES = ["St", "Ave", "Dr", "Rd", "Ln", "Blvd", "Way", "Ct", "Pl", "Cir"]
 
+# Regional pools used to weight the distribution towards populous areas
+NOVA_LOCATIONS = [loc for loc in VA_LOCATIONS if "Fairfax" in loc["county"] or "Arlington" in loc["county"] or "Alexandria" in loc["city"] or "Loudoun" in loc["county"] or "Prince William" in loc["county"]]
+HAMPTON_ROADS_LOCATIONS = [loc for loc in VA_LOCATIONS if "Virginia Beach" in loc["city"] or "Norfolk" in loc["city"] or "Chesapeake" in loc["city"] or "Newport News" in loc["city"] or "Hampton" in loc["city"]]
+RICHMOND_LOCATIONS = [loc for loc in VA_LOCATIONS if "Richmond" in loc["county"] or "Henrico" in loc["county"] or "Chesterfield" in loc["county"]]
+
 # President names for variety
 PRESIDENTS = [
     "Washington", "Adams", "Jefferson", "Madison", "Monroe", "Jackson", "Van Buren",
@@ -84,27 +90,30 @@ PRESIDENTS = [
     "Eisenhower", "Kennedy", "Johnson", "Nixon", "Ford", "Carter", "Reagan",
 ]
 
+# Base zip codes for each area
+BASE_ZIPS = {
+    "Richmond City": 23219,
+    "Henrico County": 23294,
+    "Chesterfield County": 23832,
+    "Fairfax County": 22030,
+    "Alexandria City": 22314,
+    "Arlington County": 22203,
+    "Loudoun County": 20175,
+    "Prince William County": 20110,
+    "Virginia Beach City": 23451,
+    "Norfolk City": 23510,
+    "Chesapeake City": 23320,
+    "Newport News City": 23601,
+    "Hampton City": 23669,
+    "Portsmouth City": 23701,
+    "Suffolk City": 23434,
+}
+
+BASE_VOTERS = [600, 800, 1000, 1200, 1400, 1600, 1800, 2000, 2200, 2400]
+
 def generate_zip(location):
     """Generate a realistic zip code for the location"""
-    # Use base zips for each area
-    base_zips = {
-        "Richmond City": 23219,
-        "Henrico County": 23294,
-        "Chesterfield County": 23832,
-        "Fairfax County": 22030,
-        "Alexandria City": 22314,
-        "Arlington County": 22203,
-        "Loudoun County": 20175,
-        "Prince William County": 20110,
-        "Virginia Beach City": 23451,
-        "Norfolk City": 23510,
-        "Chesapeake City": 23320,
-        "Newport News City": 23601,
-        "Hampton City": 23669,
-        "Portsmouth City": 23701,
-        "Suffolk City": 23434,
-    }
-    base = base_zips.get(location["county"], 20000)
+    base = BASE_ZIPS.get(location["county"], 20000)
     return base + random.randint(0, 50)
 
 def generate_address():
@@ -121,7 +130,7 @@ def generate_polling_place(idx, location):
     lng_offset = random.uniform(-0.05, 0.05)
 
     # Generate voters with realistic distribution
-    base_voters = random.choice([600, 800, 1000, 1200, 1400, 1600, 1800, 2000, 2200, 2400])
+    base_voters = random.choice(BASE_VOTERS)
     voters = base_voters + random.randint(-200, 300)
 
     # Multi-state registrations (1-5% of voters)
@@ -199,13 +208,13 @@ def generate_dataset(count=1000):
         # Distribute across locations with more in populous areas
         if i < 300:
             # First 300 in Northern Virginia
-            location = random.choice([loc for loc in VA_LOCATIONS if "Fairfax" in loc["county"] or "Arlington" in loc["county"] or "Alexandria" in loc["city"] or "Loudoun" in loc["county"] or "Prince William" in loc["county"]])
+            location = random.choice(NOVA_LOCATIONS)
         elif i < 500:
             # Next 200 in Hampton Roads
-            location = random.choice([loc for loc in VA_LOCATIONS if "Virginia Beach" in loc["city"] or "Norfolk" in loc["city"] or "Chesapeake" in loc["city"] or "Newport News" in loc["city"] or "Hampton" in loc["city"]])
+            location = random.choice(HAMPTON_ROADS_LOCATIONS)
         elif i < 700:
             # Next 200 in Richmond area
-            location = random.choice([loc for loc in VA_LOCATIONS if "Richmond" in loc["county"] or "Henrico" in loc["county"] or "Chesterfield" in loc["county"]])
+            location = random.choice(RICHMOND_LOCATIONS)
         else:
             # Remaining distributed across all locations
             location = random.choice(VA_LOCATIONS)
@@ -214,30 +223,185 @@ def generate_dataset(count=1000):
 
     return polling_places
 
-if __name__ == "__main__":
-    print("Generating 1000 polling places...")
-    polling_places = generate_dataset(1000)
+def generate_dataset_chunks(count=1000, seed=None, chunk_size=100_000):
+    """
+    Generate a dataset of any size as a stream of chunks (lists of dicts).
+
+    Sampling is vectorized with NumPy, so millions of places can be produced
+    without building them one at a time. The same seed and chunk size always
+    produce the same output. The regional split mirrors generate_dataset():
+    the first 30% of places are in Northern Virginia, the next 20% in Hampton
+    Roads, the next 20% around Richmond and the rest anywhere in the state.
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    id_width = max(4, len(str(count)))
+
+    locations = VA_LOCATIONS
+    loc_index = {id(loc): i for i, loc in enumerate(locations)}
+    pools = [
+        np.array([loc_index[id(loc)] for loc in pool])
+        for pool in (NOVA_LOCATIONS, HAMPTON_ROADS_LOCATIONS, RICHMOND_LOCATIONS, VA_LOCATIONS)
+    ]
+    cutoffs = np.array([0.3, 0.5, 0.7]) * count
+    loc_lat = np.array([loc["lat"] for loc in locations])
+    loc_lng = np.array([loc["lng"] for loc in locations])
+    loc_zip = np.array([BASE_ZIPS.get(loc["county"], 20000) for loc in locations])
+
+    name_parts = np.array(PRESIDENTS + STREET_NAMES)
+    presidents = np.array(PRESIDENTS)
+    building_types = np.array(BUILDING_TYPES)
+    street_names = np.array(STREET_NAMES)
+    street_types = np.array(STREET_TYPES)
+
+    for start in range(0, count, chunk_size):
+        n = min(chunk_size, count - start)
+        idx = np.arange(start, start + n)
+
+        # Pick a location from the regional pool for each place
+        region = np.searchsorted(cutoffs, idx, side="right")
+        loc = np.empty(n, dtype=np.int64)
+        for r, pool in enumerate(pools):
+            mask = region == r
+            loc[mask] = rng.choice(pool, size=int(mask.sum()))
+
+        lat = np.round(loc_lat[loc] + rng.uniform(-0.05, 0.05, n), 4)
+        lng = np.round(loc_lng[loc] + rng.uniform(-0.05, 0.05, n), 4)
+
+        voters = rng.choice(BASE_VOTERS, size=n) + rng.integers(-200, 301, n)
+        multi_state = (voters * rng.uniform(0.01, 0.05, n)).astype(np.int64)
+        recent_reg = (voters * rng.uniform(0.02, 0.15, n)).astype(np.int64)
+        purged = (voters * rng.uniform(0.005, 0.03, n)).astype(np.int64)
+
+        # Same formula as generate_polling_place()
+        risk = np.select([voters > 2000, voters > 1500, voters > 1000], [25, 15, 8], 0).astype(np.float64)
+        risk += multi_state / voters * 600
+        risk += recent_reg / voters * 120
+        risk += purged / voters * 300
+        risk = (risk + rng.integers(-5, 11, n)).astype(np.int64)
+        risk += np.where(rng.random(n) < 0.15, rng.integers(15, 36, n), 0)
+        risk = np.clip(risk, 20, 100)
+
+        first = np.where(rng.random(n) < 0.3, rng.choice(presidents, n), rng.choice(name_parts, n))
+        buildings = rng.choice(building_types, n)
+        numbers = rng.integers(100, 10000, n)
+        streets = rng.choice(street_names, n)
+        types = rng.choice(street_types, n)
+        zips = loc_zip[loc] + rng.integers(0, 51, n)
+
+        yield [
+            {
+                "id": f"pp-{i + 1:0{id_width}d}",
+                "name": f"{first[j]} {buildings[j]}",
+                "address": f"{numbers[j]} {streets[j]} {types[j]}",
+                "city": locations[loc[j]]["city"],
+                "county": locations[loc[j]]["county"],
+                "state": "VA",
+                "zip": str(zips[j]),
+                "latitude": float(lat[j]),
+                "longitude": float(lng[j]),
+                "total_voters": int(voters[j]),
+                "multi_state_registrations": int(multi_state[j]),
+                "recent_registrations": int(recent_reg[j]),
+                "purged_voters": int(purged[j]),
+                "risk_score": int(risk[j]),
+            }
+            for j, i in enumerate(range(start, start + n))
+        ]
+
+def write_records(chunks, path, fmt="json"):
+    """
+    Stream chunks of records to a file without holding them all in memory.
+
+    fmt="json" writes a JSON array with one record per line (readable by
+    app.load_data), fmt="jsonl" writes JSON lines. Returns the record count.
+    """
+    total = 0
+    with open(path, "w") as f:
+        if fmt == "json":
+            f.write("[")
+        for chunk in chunks:
+            for record in chunk:
+                line = json.dumps(record)
+                if fmt == "json":
+                    f.write(",\n" if total else "\n")
+                    f.write(line)
+                else:
+                    f.write(line + "\n")
+                total += 1
+        if fmt == "json":
+            f.write("\n]\n")
+    return total
+
+def new_statistics():
+    """Create an empty statistics accumulator"""
+    return {"count": 0, "total_voters": 0, "risk_total": 0, "high_risk": 0, "counties": {}}
+
+def accumulate_statistics(stats, places):
+    """Add an iterable of polling places to a statistics accumulator"""
+    counties = stats["counties"]
+    for p in places:
+        stats["count"] += 1
+        stats["total_voters"] += p["total_voters"]
+        stats["risk_total"] += p["risk_score"]
+        if p["risk_score"] >= 67:
+            stats["high_risk"] += 1
+        counties[p["county"]] = counties.get(p["county"], 0) + 1
+    return stats
 
-    # Save to file
-    with open("data/polling_places.json", "w") as f:
-        json.dump(polling_places, f, indent=2)
+def print_statistics(stats):
+    """Print summary statistics collected by accumulate_statistics()"""
+    count = stats["count"]
+    print(f"Generated {count} polling places")
+    if not count:
+        return
 
-    print(f"Generated {len(polling_places)} polling places")
+    print(f"Total voters: {stats['total_voters']:,}")
+    print(f"Average risk score: {stats['risk_total'] / count:.1f}")
+    print(f"High risk locations (67+): {stats['high_risk']}")
 
-    # Print some statistics
-    total_voters = sum(p["total_voters"] for p in polling_places)
-    avg_risk = sum(p["risk_score"] for p in polling_places) / len(polling_places)
-    high_risk = len([p for p in polling_places if p["risk_score"] >= 67])
+    print(f"\nTop 10 counties by polling place count:")
+    for county, county_count in sorted(stats["counties"].items(), key=lambda x: x[1], reverse=True)[:10]:
+        print(f"  {county}: {county_count}")
+
+def main():
+    """CLI interface for the generator."""
+    parser = argparse.ArgumentParser(description="Generate mock polling place data")
+    parser.add_argument("--count", type=int, default=1000, help="Number of polling places")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for reproducible output")
+    parser.add_argument("--format", choices=["json", "jsonl"], default="json", help="Output format")
+    parser.add_argument("--output", default="data/polling_places.json", help="Output file path")
+    parser.add_argument("--chunk-size", type=int, default=100_000, help="Places generated per chunk")
+    parser.add_argument(
+        "--fast",
+        action="store_true",
+        help="Use the vectorized NumPy generator (for load-testing datasets)"
+    )
+    args = parser.parse_args()
+
+    print(f"Generating {args.count} polling places...")
+    stats = new_statistics()
+
+    if not args.fast:
+        random.seed(args.seed)
+        polling_places = generate_dataset(args.count)
+        if args.format == "json":
+            with open(args.output, "w") as f:
+                json.dump(polling_places, f, indent=2)
+        else:
+            write_records([polling_places], args.output, args.format)
+        print_statistics(accumulate_statistics(stats, polling_places))
+        return
 
-    print(f"Total voters: {total_voters:,}")
-    print(f"Average risk score: {avg_risk:.1f}")
-    print(f"High risk locations (67+): {high_risk}")
+    def tally(chunks):
+        for chunk in chunks:
+            accumulate_statistics(stats, chunk)
+            yield chunk
 
-    # County distribution
-    counties = {}
-    for p in polling_places:
-        counties[p["county"]] = counties.get(p["county"], 0) + 1
+    chunks = generate_dataset_chunks(args.count, seed=args.seed, chunk_size=args.chunk_size)
+    write_records(tally(chunks), args.output, args.format)
+    print_statistics(stats)
 
-    print(f"\nTop 10 counties by polling place count:")
-    for county, count in sorted(counties.items(), key=lambda x: x[1], reverse=True)[:10]:
-        print(f"  {county}: {count}")
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,14 @@
 #!/usr/bin/env python3
 """Generate mock report data for Virginia polling places"""
 
+import argparse
+import itertools
 import json
 import random
 from datetime import datetime, timedelta
 
+from ids import ALPHABET, PREFIX, encode, format_report_id, timestamp_ms
+
 # Issue types
 ISSUE_TYPES = [
     "Long lines",
@@ -86,19 +90,28 @@ DESCRIPTIONS = {
     ],
 }
 
+# Placeholder values used when filling in description templates
+DESCRIPTION_VALUES = {
+    "{time}": [1, 1.5, 2, 2.5, 3, 3.5, 4],
+    "{count}": [50, 75, 100, 150, 200, 250, 300],
+    "{machines}": [2, 3, 4, 5],
+    "{time_str}": ["7am", "8am", "9am", "noon", "5pm", "6pm"],
+    "{group}": ["elderly", "disabled", "working", "first-time"],
+    "{obstacle}": ["temporary fencing", "construction materials", "parked vehicles", "snow/ice"],
+}
+
+EMAIL_DOMAINS = ["gmail.com", "yahoo.com", "hotmail.com", "outlook.com", "icloud.com", "aol.com"]
+AREA_CODES = ["703", "571", "804", "757", "540", "434"]
+
+# Election day 2024-11-05, polls open 6am
+ELECTION_DAY_START = datetime(2024, 11, 5, 6, 0, 0)
+
 def generate_description(issue_type):
     """Generate a description for the issue type"""
     template = random.choice(DESCRIPTIONS.get(issue_type, DESCRIPTIONS["Other"]))
 
     # Fill in template variables
-    replacements = {
-        "{time}": str(random.choice([1, 1.5, 2, 2.5, 3, 3.5, 4])),
-        "{count}": str(random.choice([50, 75, 100, 150, 200, 250, 300])),
-        "{machines}": str(random.choice([2, 3, 4, 5])),
-        "{time_str}": random.choice(["7am", "8am", "9am", "noon", "5pm", "6pm"]),
-        "{group}": random.choice(["elderly", "disabled", "working", "first-time"]),
-        "{obstacle}": random.choice(["temporary fencing", "construction materials", "parked vehicles", "snow/ice"]),
-    }
+    replacements = {key: str(random.choice(values)) for key, values in DESCRIPTION_VALUES.items()}
 
     for key, value in replacements.items():
         template = template.replace(key, value)
@@ -107,7 +120,7 @@ def generate_description(issue_type):
 
 def generate_email(first_name, last_name):
     """Generate a realistic email address"""
-    domains = ["gmail.com", "yahoo.com", "hotmail.com", "outlook.com", "icloud.com", "aol.com"]
+    domains = EMAIL_DOMAINS
     patterns = [
         f"{first_name.lower()}.{last_name.lower()}@{random.choice(domains)}",
         f"{first_name[0].lower()}{last_name.lower()}@{random.choice(domains)}",
@@ -118,8 +131,7 @@ def generate_email(first_name, last_name):
 
 def generate_phone():
     """Generate a Virginia phone number"""
-    area_codes = ["703", "571", "804", "757", "540", "434"]
-    area = random.choice(area_codes)
+    area = random.choice(AREA_CODES)
     prefix = random.randint(200, 999)
     line = random.randint(1000, 9999)
     return f"{area}-{prefix}-{line:04d}"
@@ -127,13 +139,13 @@ def generate_phone():
 def generate_timestamp():
     """Generate a timestamp for election day"""
     # Election day 2024-11-05, between 6am and 8pm
-    base = datetime(2024, 11, 5, 6, 0, 0)
+    base = ELECTION_DAY_START
     hours = random.randint(0, 14)  # 6am to 8pm
     minutes = random.randint(0, 59)
     return (base + timedelta(hours=hours, minutes=minutes)).isoformat() + "Z"
 
 def generate_report(idx, polling_place_ids):
-    """Generate a single report"""
+    """Generate a single report (its ID is assigned once reports are sorted)"""
     first_name = random.choice(FIRST_NAMES)
     last_name = random.choice(LAST_NAMES)
     issue_type = random.choice(ISSUE_TYPES)
@@ -152,7 +164,7 @@ def generate_report(idx, polling_place_ids):
     polling_place_id = random.choice(polling_place_ids)
 
     return {
-        "id": f"rpt-{idx+1:03d}",
+        "id": None,
         "polling_place_id": polling_place_id,
         "reporter_name": f"{first_name} {last_name}",
         "reporter_email": generate_email(first_name, last_name),
@@ -176,36 +188,195 @@ def generate_reports(count=75, polling_places_file="data/polling_places.json"):
     for i in range(count):
         reports.append(generate_report(i, polling_place_ids))
 
-    # Sort by timestamp
+    # Sort by timestamp, then mint IDs in that order so they sort the same way
     reports.sort(key=lambda x: x["timestamp"])
+    node = random.getrandbits(40)
+    for sequence, report in enumerate(reports):
+        report["id"] = format_report_id(timestamp_ms(report["timestamp"]), node, sequence)
 
     return reports
 
-if __name__ == "__main__":
-    print("Generating 75 reports...")
-    reports = generate_reports(75)
+def load_polling_place_ids(polling_places_file="data/polling_places.json"):
+    """Load polling place IDs from a JSON array or JSON-lines file"""
+    with open(polling_places_file, "r") as f:
+        if polling_places_file.endswith(".jsonl"):
+            return [json.loads(line)["id"] for line in f if line.strip()]
+        return [p["id"] for p in json.load(f)]
+
+def expand_templates(templates):
+    """Expand each description template into every possible filled-in text"""
+    expanded = []
+    for template in templates:
+        keys = [key for key in DESCRIPTION_VALUES if key in template]
+        texts = []
+        for values in itertools.product(*(DESCRIPTION_VALUES[key] for key in keys)):
+            text = template
+            for key, value in zip(keys, values):
+                text = text.replace(key, str(value))
+            texts.append(text)
+        expanded.append(texts)
+    return expanded
+
+def generate_reports_chunks(count, polling_place_ids, seed=None, chunk_size=100_000):
+    """
+    Generate any number of reports as a stream of chunks (lists of dicts).
+
+    Sampling is vectorized with NumPy and reproducible for a given seed and
+    chunk size. Timestamps follow the same 6am-8pm distribution as
+    generate_timestamp(), but are emitted in order so the stream never has
+    to be sorted in memory; time-ordered IDs are minted in that order.
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    id_node = encode(int(rng.integers(0, 2 ** 40)), 8)
+    place_ids = np.asarray(polling_place_ids)
+
+    first_names = np.array(FIRST_NAMES)
+    last_names = np.array(LAST_NAMES)
+    issue_types = np.array(ISSUE_TYPES)
+    domains = np.array(EMAIL_DOMAINS)
+    area_codes = np.array(AREA_CODES)
+    descriptions = {
+        issue_type: expand_templates(DESCRIPTIONS.get(issue_type, DESCRIPTIONS["Other"]))
+        for issue_type in set(ISSUE_TYPES)
+    }
+
+    # Reports per minute after 6am, drawn for the whole day; each chunk
+    # expands only its own slice of that, in sorted order
+    minute_slots = 15 * 60
+    per_minute = rng.multinomial(count, [1 / minute_slots] * minute_slots)
+    minute_ends = np.cumsum(per_minute)
+    timestamps = [
+        (ELECTION_DAY_START + timedelta(minutes=int(m))).isoformat() + "Z"
+        for m in range(minute_slots)
+    ]
+    # ID prefix (PREFIX plus the encoded time) for each minute
+    id_prefixes = [PREFIX + encode(timestamp_ms(ts), 10) + id_node for ts in timestamps]
+    alphabet = np.frombuffer(ALPHABET.encode(), dtype="S1")
+    digit_shifts = np.arange(35, -1, -5)
 
-    # Save to file
-    with open("data/reports.json", "w") as f:
-        json.dump(reports, f, indent=2)
+    for start in range(0, count, chunk_size):
+        n = min(chunk_size, count - start)
+        minutes = np.searchsorted(minute_ends, np.arange(start, start + n), side="right")
 
-    print(f"Generated {len(reports)} reports")
+        first = rng.choice(first_names, n)
+        last = rng.choice(last_names, n)
+        issues = rng.choice(issue_types, n)
+        status_roll = rng.random(n)
+        places = rng.choice(place_ids, n)
+        email_pattern = rng.integers(0, 4, n)
+        email_domain = rng.choice(domains, n)
+        email_number = rng.integers(1, 100, n)
+        areas = rng.choice(area_codes, n)
+        prefixes = rng.integers(200, 1000, n)
+        lines = rng.integers(1000, 10000, n)
+        template_roll = rng.random(n)
+        text_roll = rng.random(n)
+        # Sequence part of the IDs (8 base32 digits), encoded for the whole chunk
+        sequence = np.arange(start, start + n)
+        id_suffixes = alphabet[(sequence[:, None] >> digit_shifts) & 31].view("S8").ravel().astype("U8").tolist()
 
-    # Print some statistics
+        chunk = []
+        for j in range(n):
+            first_name = str(first[j])
+            last_name = str(last[j])
+            issue_type = str(issues[j])
+
+            if status_roll[j] < 0.7:
+                status = "reported"
+            elif status_roll[j] < 0.9:
+                status = "investigating"
+            else:
+                status = "resolved"
+
+            pattern = email_pattern[j]
+            if pattern == 0:
+                local = f"{first_name.lower()}.{last_name.lower()}"
+            elif pattern == 1:
+                local = f"{first_name[0].lower()}{last_name.lower()}"
+            elif pattern == 2:
+                local = f"{first_name.lower()}{last_name[0].lower()}"
+            else:
+                local = f"{first_name.lower()}{email_number[j]}"
+
+            templates = descriptions[issue_type]
+            texts = templates[int(template_roll[j] * len(templates))]
+
+            chunk.append({
+                "id": id_prefixes[minutes[j]] + id_suffixes[j],
+                "polling_place_id": str(places[j]),
+                "reporter_name": f"{first_name} {last_name}",
+                "reporter_email": f"{local}@{email_domain[j]}",
+                "reporter_phone": f"{areas[j]}-{prefixes[j]}-{lines[j]:04d}",
+                "issue_type": issue_type,
+                "description": texts[int(text_roll[j] * len(texts))],
+                "timestamp": timestamps[minutes[j]],
+                "status": status
+            })
+        yield chunk
+
+def main():
+    """CLI interface for the generator."""
+    parser = argparse.ArgumentParser(description="Generate mock report data")
+    parser.add_argument("--count", type=int, default=75, help="Number of reports")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for reproducible output")
+    parser.add_argument(
+        "--places",
+        default="data/polling_places.json",
+        help="Polling places file (JSON array or .jsonl) to draw IDs from"
+    )
+    parser.add_argument("--format", choices=["json", "jsonl"], default="json", help="Output format")
+    parser.add_argument("--output", default="data/reports.json", help="Output file path")
+    parser.add_argument("--chunk-size", type=int, default=100_000, help="Reports generated per chunk")
+    parser.add_argument(
+        "--fast",
+        action="store_true",
+        help="Use the vectorized NumPy generator (for load-testing datasets)"
+    )
+    args = parser.parse_args()
+
+    from generate_data import write_records
+
+    print(f"Generating {args.count} reports...")
     issue_counts = {}
-    for report in reports:
-        issue_type = report["issue_type"]
-        issue_counts[issue_type] = issue_counts.get(issue_type, 0) + 1
+    status_counts = {}
+
+    def tally(chunks):
+        for chunk in chunks:
+            for report in chunk:
+                issue_counts[report["issue_type"]] = issue_counts.get(report["issue_type"], 0) + 1
+                status_counts[report["status"]] = status_counts.get(report["status"], 0) + 1
+            yield chunk
+
+    if args.fast:
+        chunks = generate_reports_chunks(
+            args.count,
+            load_polling_place_ids(args.places),
+            seed=args.seed,
+            chunk_size=args.chunk_size
+        )
+        total = write_records(tally(chunks), args.output, args.format)
+    else:
+        random.seed(args.seed)
+        reports = generate_reports(args.count, args.places)
+        if args.format == "json":
+            with open(args.output, "w") as f:
+                json.dump(reports, f, indent=2)
+        else:
+            write_records([reports], args.output, args.format)
+        total = len(reports)
+        list(tally([reports]))
+
+    print(f"Generated {total} reports")
 
     print(f"\nReports by issue type:")
     for issue_type, count in sorted(issue_counts.items(), key=lambda x: x[1], reverse=True):
         print(f"  {issue_type}: {count}")
 
-    status_counts = {}
-    for report in reports:
-        status = report["status"]
-        status_counts[status] = status_counts.get(status, 0) + 1
-
     print(f"\nReports by status:")
     for status, count in sorted(status_counts.items(), key=lambda x: x[1], reverse=True):
         print(f"  {status}: {count}")
+
+if __name__ == "__main__":
+    main()
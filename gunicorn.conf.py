@@ -0,0 +1,59 @@
+"""
+Gunicorn configuration for multi-process serving.
+
+The app is imported once in the master (preload_app) and the data is loaded
+there before any worker is forked, so every worker shares the same parsed
+copy of the polling places instead of loading its own. Report writes are
+coordinated between workers by store.DataStore, and each worker commits
+its queued reports (ingest.py) before exiting.
+
+Each worker writes its metrics to METRICS_DIR (a fresh temporary directory
+unless it is set), so that /metrics reports the total of all workers.
+"""
+
+import gc
+import glob
+import multiprocessing
+import os
+import tempfile
+
+bind = f":{os.environ.get('PORT', '8080')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+timeout = 0
+preload_app = True
+
+# Set before the app is imported, so metrics.init_app picks it up
+if not os.environ.get('METRICS_DIR'):
+    os.environ['METRICS_DIR'] = tempfile.mkdtemp(prefix='ep-metrics-')
+
+
+def on_starting(server):
+    """Start counting from zero rather than from a previous run's files."""
+    for path in glob.glob(os.path.join(os.environ['METRICS_DIR'], '*.json')):
+        os.remove(path)
+
+
+def when_ready(server):
+    """Load the data in the master, right before workers are forked."""
+    from app import county_summaries, rollups, store
+
+    store.refresh()
+    store.places.warm()
+    rollups.warm()
+    county_summaries.warm()
+    # Keep the garbage collector from touching (and so copying) the shared
+    # objects in every worker
+    gc.freeze()
+    server.log.info("Loaded %d polling places and %d reports before forking",
+                    len(store.places), len(store.reports))
+
+
+def worker_exit(server, worker):
+    """Commit any reports still queued, and save the final metrics, before the worker goes away."""
+    import metrics
+    from app import ingest_queue
+
+    if not ingest_queue.flush(timeout=10):
+        server.log.warning("Worker %s exited with reports still queued", worker.pid)
+    metrics.write_worker_file()
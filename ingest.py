@@ -0,0 +1,265 @@
+"""
+Asynchronous ingestion of submitted reports.
+
+submit_report validates the form, gives the report a time-ordered ID (see
+ids.py) and hands it to an IngestQueue, which returns immediately. A background writer thread takes
+reports off the bounded queue and commits them in batches, each batch being
+one append to reports.log through DataStore.add_reports(), flushed when it
+reaches INGEST_BATCH_SIZE reports or INGEST_BATCH_WINDOW_MS after its first
+report arrived. A burst of submissions therefore costs a handful of file
+writes instead of one per report. If the queue is full the request commits
+its report itself, so a report is never turned away.
+
+Until a report is committed it is only in memory. The worker that queued it
+merges it into the pages it renders, and the IDs (and polling places) of
+the submitter's own pending reports are kept in their session. When they
+then view that polling place on another worker, it waits for the reports
+to be committed, up to INGEST_VISIBILITY_TIMEOUT_MS, before rendering
+(read-your-writes). Only the IDs go in the session: Flask's session cookie
+is signed, not encrypted, and has to stay small.
+"""
+
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+from flask import session
+
+import metrics
+
+
+logger = logging.getLogger(__name__)
+
+REQUIRED_FIELDS = ('polling_place_id', 'reporter_name', 'reporter_email', 'issue_type', 'description')
+
+# Must match the options in templates/report_form.html
+ISSUE_TYPES = (
+    'Long lines',
+    'Equipment failure',
+    'Accessibility issue',
+    'Staffing problem',
+    'Voter intimidation',
+    'ID requirements issue',
+    'Other',
+)
+
+# Longest accepted value of each form field
+MAX_LENGTHS = {
+    'reporter_name': 100,
+    'reporter_email': 254,
+    'reporter_phone': 30,
+    'description': 2000,
+}
+
+# Pending reports remembered per session for read-your-writes, as
+# [report ID, polling place ID] pairs
+MAX_REMEMBERED = 5
+REMEMBERED_KEY = 'awaited_reports'
+
+# Seconds between checks for remembered reports to be committed
+REMEMBERED_POLL_INTERVAL = 0.005
+
+# Seconds to wait before retrying a batch that failed to commit
+RETRY_DELAY = 1.0
+
+
+def validate_report(form, places):
+    """
+    Check a submitted report form.
+
+    Returns (fields, errors): the cleaned form fields, and a list of error
+    messages that is empty when the report can be accepted.
+    """
+    fields = {name: (form.get(name) or '').strip() for name in REQUIRED_FIELDS + ('reporter_phone',)}
+    errors = [f"{name.replace('_', ' ').capitalize()} is required." for name in REQUIRED_FIELDS if not fields[name]]
+    if fields['polling_place_id'] and places.row_of(fields['polling_place_id']) is None:
+        errors.append('Unknown polling place.')
+    if fields['issue_type'] and fields['issue_type'] not in ISSUE_TYPES:
+        errors.append('Unknown issue type.')
+    for name, limit in MAX_LENGTHS.items():
+        if len(fields[name]) > limit:
+            errors.append(f"{name.replace('_', ' ').capitalize()} must be at most {limit} characters.")
+    return fields, errors
+
+
+class IngestQueue:
+    """Bounded queue of reports committed to a DataStore by a writer thread."""
+
+    def __init__(self, store, app=None):
+        self.store = store
+        self.app = None
+        self._lock = threading.Lock()
+        self._committed = threading.Condition(self._lock)
+        self._pid = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.config.setdefault('INGEST_QUEUE_SIZE', int(os.environ.get('INGEST_QUEUE_SIZE', 10000)))
+        app.config.setdefault('INGEST_BATCH_SIZE', int(os.environ.get('INGEST_BATCH_SIZE', 200)))
+        app.config.setdefault('INGEST_BATCH_WINDOW_MS', float(os.environ.get('INGEST_BATCH_WINDOW_MS', 50)))
+        # Longest a page waits for the user's own report, queued by another
+        # worker, to be committed: the batch window plus the write
+        app.config.setdefault('INGEST_VISIBILITY_TIMEOUT_MS', float(os.environ.get('INGEST_VISIBILITY_TIMEOUT_MS', 3000)))
+        atexit.register(self.flush, timeout=10)
+
+    def _start(self):
+        """
+        Create the queue and writer thread for this process.
+
+        Called on every submit: a forked gunicorn worker inherits the
+        master's objects but not its threads, so it starts its own.
+        """
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=self.app.config['INGEST_QUEUE_SIZE'])
+            # Reports accepted but not yet committed, by ID, in arrival order
+            self._pending = {}
+            self._enqueued = 0
+            self._done = 0
+            thread = threading.Thread(target=self._run, name='report-ingest', daemon=True)
+            thread.start()
+            self._pid = os.getpid()
+
+    def submit(self, report):
+        """Accept a report for committing and return without waiting for it."""
+        self._start()
+        with self._lock:
+            self._pending[report['id']] = report
+            self._enqueued += 1
+        try:
+            self._queue.put_nowait(report)
+        except queue.Full:
+            # Back-pressure: commit in the request rather than reject it
+            metrics.INGEST_SYNC_COMMITS.inc()
+            try:
+                self._commit([report])
+            except Exception:
+                # Not committed: stop showing it as pending and let flush()
+                # stop waiting for it; the caller reports the failure
+                self._finish([report])
+                raise
+        return report
+
+    def pending(self, polling_place_id=None):
+        """Reports accepted by this process but not yet committed."""
+        if self._pid != os.getpid():
+            return []
+        with self._lock:
+            reports = list(self._pending.values())
+        if polling_place_id is not None:
+            reports = [r for r in reports if r['polling_place_id'] == polling_place_id]
+        return reports
+
+    def flush(self, timeout=None):
+        """Wait until every report accepted so far is committed."""
+        if self._pid != os.getpid():
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            target = self._enqueued
+            while self._done < target:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._committed.wait(remaining)
+        return True
+
+    def _next_batch(self):
+        """Block for a report, then gather more until the batch is full or its window closes."""
+        batch = [self._queue.get()]
+        batch_size = self.app.config['INGEST_BATCH_SIZE']
+        deadline = time.monotonic() + self.app.config['INGEST_BATCH_WINDOW_MS'] / 1000
+        while len(batch) < batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            while True:
+                try:
+                    self._commit(batch)
+                    break
+                except OSError:
+                    # Keep the batch: these reports were already acknowledged
+                    logger.exception('Failed to write %d reports; retrying', len(batch))
+                    time.sleep(RETRY_DELAY)
+                except Exception:
+                    # Not a failed write, so retrying could write the batch twice
+                    logger.exception('Failed to commit %d reports', len(batch))
+                    self._finish(batch)
+                    break
+
+    def _commit(self, batch):
+        start = time.perf_counter()
+        self.store.add_reports(batch)
+        metrics.INGEST_COMMIT_LATENCY.observe(time.perf_counter() - start)
+        metrics.INGEST_BATCH_SIZE.observe(len(batch))
+        metrics.REPORTS_COMMITTED.inc(len(batch))
+        self._finish(batch)
+
+    def _finish(self, batch):
+        """Stop tracking a batch as pending and wake flush() waiters."""
+        with self._lock:
+            for report in batch:
+                self._pending.pop(report['id'], None)
+            self._done += len(batch)
+            self._committed.notify_all()
+
+
+def remember(report):
+    """Keep a just-submitted report's ID in the session until it is committed."""
+    remembered = session.get(REMEMBERED_KEY, [])
+    entry = [report['id'], report['polling_place_id']]
+    session[REMEMBERED_KEY] = (remembered + [entry])[-MAX_REMEMBERED:]
+
+
+def await_remembered(ingest_queue, polling_place_id):
+    """
+    Wait until the session's remembered reports for a polling place are
+    committed, so the data loaded next includes them.
+
+    Reports still queued in this process need no waiting, since the caller
+    merges ingest_queue.pending() in. For the others (queued by another
+    worker) this waits at most INGEST_VISIBILITY_TIMEOUT_MS. Reports that
+    are committed, or did not show up in time, are forgotten, so no page
+    waits for the same report twice.
+    """
+    remembered = session.get(REMEMBERED_KEY)
+    if not remembered:
+        return
+    store = ingest_queue.store
+    queued_here = {report['id'] for report in ingest_queue.pending(polling_place_id)}
+    awaited = [
+        report_id for report_id, place_id in remembered
+        if place_id == polling_place_id and report_id not in queued_here
+    ]
+    deadline = time.monotonic() + ingest_queue.app.config['INGEST_VISIBILITY_TIMEOUT_MS'] / 1000
+    store.refresh()
+    while any(report_id not in store.report_positions for report_id in awaited):
+        if time.monotonic() >= deadline:
+            logger.warning('Reports %s not committed in time to show them', awaited)
+            break
+        time.sleep(REMEMBERED_POLL_INTERVAL)
+        store.refresh()
+
+    still_pending = [
+        [report_id, place_id] for report_id, place_id in remembered
+        if report_id not in store.report_positions and report_id not in awaited
+    ]
+    if len(still_pending) != len(remembered):
+        session[REMEMBERED_KEY] = still_pending
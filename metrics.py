@@ -0,0 +1,360 @@
+"""
+Lightweight request metrics exposed in Prometheus text format.
+
+Per-route latency histograms are recorded from Flask's before_request and
+after_request hooks, and routes time their internal phases (data load,
+filtering, sorting, aggregation, template render, JSON serialization) with
+the phase() context manager. Everything is kept in process memory and served
+on /metrics.
+
+Under gunicorn every worker has its own copy of the metrics, so when
+METRICS_DIR is set each worker also writes its values to a file of its own
+there (at most every METRICS_WRITE_INTERVAL seconds, and on every scrape),
+and /metrics adds up the files of all workers, like the Prometheus client's
+multiprocess mode. Files of workers that exited are kept, so counters never
+go backwards when a worker is replaced.
+"""
+
+import bisect
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from flask import Response, g, has_request_context, request
+
+
+# Upper bounds in seconds, from 0.5ms to 10s
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def format_labels(names, values):
+    """Render a label set as {a="1",b="2"} (empty string when unlabelled)."""
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+def format_value(value):
+    """Render a sample value the way Prometheus expects."""
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """A monotonically increasing count, optionally split by labels."""
+
+    type = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        # Unlabelled counters are exported as 0 before the first increment
+        self._values = {} if self.labels else {(): 0}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels[name] for name in self.labels), 0)
+
+    def export(self):
+        """The values as JSON-friendly [label values, count] pairs."""
+        with self._lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+    @staticmethod
+    def combine(values, exported):
+        """Add the output of another process's export() into values."""
+        for key, value in exported:
+            key = tuple(key)
+            values[key] = values.get(key, 0) + value
+
+    def samples(self, values=None):
+        """Samples of this process's values, or of the given combined ones."""
+        if values is None:
+            with self._lock:
+                items = sorted(self._values.items())
+        else:
+            items = sorted(values.items())
+        for key, value in items:
+            yield self.name, format_labels(self.labels, key), value
+
+
+class Histogram:
+    """Cumulative bucketed observations, optionally split by labels."""
+
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                # Per-bucket counts (last slot is +Inf), then sum
+                series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def export(self):
+        """The values as JSON-friendly [label values, [bucket counts, sum]] pairs."""
+        with self._lock:
+            return [[list(key), [list(counts), total]] for key, (counts, total) in self._values.items()]
+
+    @staticmethod
+    def combine(values, exported):
+        """Add the output of another process's export() into values."""
+        for key, (counts, total) in exported:
+            key = tuple(key)
+            series = values.get(key)
+            if series is None:
+                values[key] = [list(counts), total]
+            else:
+                series[0] = [a + b for a, b in zip(series[0], counts)]
+                series[1] += total
+
+    def samples(self, values=None):
+        """Samples of this process's values, or of the given combined ones."""
+        if values is None:
+            with self._lock:
+                items = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        else:
+            items = sorted(values.items())
+        bucket_labels = self.labels + ('le',)
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                yield self.name + '_bucket', format_labels(bucket_labels, key + (format_value(bound),)), cumulative
+            yield self.name + '_sum', format_labels(self.labels, key), total
+            yield self.name + '_count', format_labels(self.labels, key), cumulative
+
+
+class Registry:
+    """Collection of metrics rendered together on /metrics."""
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def export(self):
+        """Every metric's values, keyed by metric name."""
+        return {metric.name: metric.export() for metric in self.metrics}
+
+    def render(self, exports=None):
+        """
+        Text exposition of this process's metrics, or of the sum of the
+        given export() outputs (one per process) when there are any.
+        """
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            values = None
+            if exports is not None:
+                values = {}
+                for exported in exports:
+                    metric.combine(values, exported.get(metric.name, ()))
+            for name, labels, value in metric.samples(values):
+                lines.append(f'{name}{labels} {format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+class WorkerFiles:
+    """
+    One metrics file per process in a directory shared by every worker.
+
+    Each process starts a thread that rewrites its file (atomically, and
+    only when a value changed) every `interval` seconds; collect() reads
+    all of them back.
+    """
+
+    def __init__(self, registry, directory, interval=1.0):
+        self.registry = registry
+        self.directory = directory
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def start(self):
+        """
+        Pick this process's file and start its writer thread.
+
+        A forked gunicorn worker inherits the master's objects but not its
+        threads, so each worker does this on its first request.
+        """
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            # Not the pid alone: a later worker may get the same pid, and
+            # must not replace the totals of the one that exited
+            self._path = os.path.join(self.directory, f'{os.getpid()}-{uuid.uuid4().hex[:8]}.json')
+            self._written = None
+            thread = threading.Thread(target=self._run, name='metrics-writer', daemon=True)
+            thread.start()
+            self._pid = os.getpid()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.write()
+
+    def write(self):
+        """Write this process's values to its file if they changed."""
+        if self._pid != os.getpid():
+            return
+        with self._lock:
+            data = json.dumps(self.registry.export())
+            if data == self._written:
+                return
+            temporary = self._path + '.tmp'
+            with open(temporary, 'w') as f:
+                f.write(data)
+            os.replace(temporary, self._path)
+            self._written = data
+
+    def collect(self):
+        """export() of every process that wrote a file, this one up to date."""
+        self.start()
+        self.write()
+        exports = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    exports.append(json.load(f))
+            except FileNotFoundError:
+                continue
+        return exports
+
+
+REGISTRY = Registry()
+
+# Set by init_app when METRICS_DIR is configured
+worker_files = None
+
+REQUEST_LATENCY = REGISTRY.register(Histogram(
+    'ep_request_duration_seconds',
+    'Time spent handling HTTP requests.',
+    labels=('endpoint', 'method', 'status'),
+))
+PHASE_LATENCY = REGISTRY.register(Histogram(
+    'ep_phase_duration_seconds',
+    'Time spent in internal phases of a request.',
+    labels=('endpoint', 'phase'),
+))
+REPORTS_SUBMITTED = REGISTRY.register(Counter(
+    'ep_reports_submitted_total',
+    'Problem reports submitted.',
+))
+REPORTS_COMMITTED = REGISTRY.register(Counter(
+    'ep_reports_committed_total',
+    'Problem reports appended to reports.log by the ingest writer.',
+))
+INGEST_SYNC_COMMITS = REGISTRY.register(Counter(
+    'ep_ingest_sync_commits_total',
+    'Reports committed inside the request because the ingest queue was full.',
+))
+INGEST_BATCH_SIZE = REGISTRY.register(Histogram(
+    'ep_ingest_batch_size',
+    'Reports per batch committed by the ingest writer.',
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000),
+))
+INGEST_COMMIT_LATENCY = REGISTRY.register(Histogram(
+    'ep_ingest_commit_duration_seconds',
+    'Time spent writing one batch of reports.',
+))
+CACHE_HITS = REGISTRY.register(Counter(
+    'ep_cache_hits_total',
+    'Cache lookups that found an entry.',
+    labels=('cache',),
+))
+CACHE_MISSES = REGISTRY.register(Counter(
+    'ep_cache_misses_total',
+    'Cache lookups that did not find an entry.',
+    labels=('cache',),
+))
+
+
+def current_endpoint():
+    return request.endpoint or 'unmatched'
+
+
+@contextmanager
+def phase(name):
+    """Time a block as one phase of the current request."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        # Also used outside requests (e.g. benchmarks calling load_data)
+        if has_request_context():
+            PHASE_LATENCY.observe(time.perf_counter() - start, endpoint=current_endpoint(), phase=name)
+
+
+def write_worker_file():
+    """Write this process's metrics file now, e.g. when a worker exits."""
+    if worker_files is not None:
+        worker_files.write()
+
+
+def init_app(app):
+    """Install the timing hooks and the /metrics endpoint on a Flask app."""
+    global worker_files
+    app.config.setdefault('METRICS_DIR', os.environ.get('METRICS_DIR', ''))
+    app.config.setdefault('METRICS_WRITE_INTERVAL', float(os.environ.get('METRICS_WRITE_INTERVAL', 1)))
+    if app.config['METRICS_DIR']:
+        worker_files = WorkerFiles(REGISTRY, app.config['METRICS_DIR'], app.config['METRICS_WRITE_INTERVAL'])
+
+    @app.before_request
+    def start_timer():
+        if worker_files is not None:
+            worker_files.start()
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def record_latency(response):
+        start = g.pop('metrics_start', None)
+        if start is not None:
+            REQUEST_LATENCY.observe(
+                time.perf_counter() - start,
+                endpoint=current_endpoint(),
+                method=request.method,
+                status=response.status_code,
+            )
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        """Prometheus scrape endpoint, totalled over every worker when METRICS_DIR is set"""
+        exports = worker_files.collect() if worker_files is not None else None
+        return Response(REGISTRY.render(exports), content_type='text/plain; version=0.0.4; charset=utf-8')
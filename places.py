@@ -0,0 +1,405 @@
+"""
+Compact columnar storage for polling places.
+
+Instead of one dict per place, each field is stored as a column: typed arrays
+for the numeric fields, dictionary-encoded columns for the low-cardinality
+strings (county, city, state, zip) and plain lists for the rest. Templates
+get lightweight PlaceRow views, and filtering and sorting work on the columns
+with sort orders computed once per dataset.
+
+Columns and indexes only need len() and indexing, so a table can also be
+backed by memoryviews into a memory-mapped snapshot (see snapshot.py).
+"""
+
+import bisect
+import re
+from array import array
+
+
+# Field order matches the JSON records
+FIELDS = (
+    'id', 'name', 'address', 'city', 'county', 'state', 'zip',
+    'latitude', 'longitude', 'total_voters', 'multi_state_registrations',
+    'recent_registrations', 'purged_voters', 'risk_score',
+)
+
+# Typecodes for the numeric columns
+NUMERIC_FIELDS = {
+    'latitude': 'd',
+    'longitude': 'd',
+    'total_voters': 'i',
+    'multi_state_registrations': 'i',
+    'recent_registrations': 'i',
+    'purged_voters': 'i',
+    'risk_score': 'i',
+}
+
+# Low-cardinality strings, stored as small integer codes into a value list
+CATEGORY_FIELDS = ('city', 'county', 'state', 'zip')
+
+# Columns polling_places_list can sort by
+SORT_FIELDS = (
+    'risk_score', 'total_voters', 'multi_state_registrations',
+    'recent_registrations', 'purged_voters', 'name', 'county',
+)
+
+
+# Columns the place picker searches, in the order their matches are listed
+SEARCH_FIELDS = ('name', 'city', 'county')
+
+# Index entries search() looks at before giving up on finding more matches
+MAX_SEARCH_SCAN = 5000
+
+WORD = re.compile(r'\w+')
+
+
+def tokenize(text):
+    """Lower-case words of a string, for prefix search."""
+    return WORD.findall(text.lower())
+
+
+class CategoryColumn:
+    """A string column stored as codes into a list of distinct values."""
+
+    def __init__(self, codes, values):
+        self.codes = codes
+        self.values = values
+        self._code_of = {value: code for code, value in enumerate(values)}
+
+    @classmethod
+    def from_values(cls, values):
+        distinct = {}
+        codes = array('I', (distinct.setdefault(v, len(distinct)) for v in values))
+        return cls(codes, list(distinct))
+
+    def code_of(self, value):
+        """Code for a value, or None if no row has it."""
+        return self._code_of.get(value)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, row):
+        return self.values[self.codes[row]]
+
+
+class StringColumn:
+    """UTF-8 strings packed into one buffer, decoded on access."""
+
+    def __init__(self, offsets, data):
+        # offsets has one more entry than there are strings
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row):
+        return str(self.data[self.offsets[row]:self.offsets[row + 1]], 'utf-8')
+
+    def tolist(self):
+        return [self[row] for row in range(len(self))]
+
+
+class PlaceRow:
+    """Read-only view of one polling place, usable like the original dict."""
+
+    __slots__ = ('_table', '_row')
+
+    def __init__(self, table, row):
+        self._table = table
+        self._row = row
+
+    def __getattr__(self, name):
+        try:
+            return self._table.value(name, self._row)
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __getitem__(self, name):
+        return self._table.value(name, self._row)
+
+    def get(self, name, default=None):
+        try:
+            return self._table.value(name, self._row)
+        except KeyError:
+            return default
+
+    def to_dict(self):
+        return self._table.record(self._row)
+
+    def __repr__(self):
+        return f'<PlaceRow {self.id}>'
+
+
+def column_property(column):
+    """Property reading one column at the row's index."""
+    if isinstance(column, CategoryColumn):
+        codes, values = column.codes, column.values
+        return property(lambda row: values[codes[row._row]])
+    return property(lambda row: column[row._row])
+
+
+def make_row_class(columns):
+    """A PlaceRow subclass with a direct property for every column."""
+    attrs = {'__slots__': ()}
+    for field, column in columns.items():
+        attrs[field] = column_property(column)
+    return type('PlaceRow', (PlaceRow,), attrs)
+
+
+class PlaceTable:
+    """All polling places, stored column by column."""
+
+    def __init__(self, columns, extras=None, orders=None, ranks=None, county_rows=None, id_order=None,
+                 search_index=None):
+        self.columns = columns
+        # Sparse {row: {field: value}} for fields outside FIELDS
+        self.extras = extras or {}
+        self._size = len(columns['id'])
+        # Prebuilt indexes (from a snapshot) are used as they are; anything
+        # missing is computed on first use
+        self._orders = orders or {}
+        self._ranks = ranks or {}
+        self._county_rows = county_rows
+        self._id_order = id_order
+        self._row_of = None
+        self._search_index = search_index
+        # Row views read columns through per-table properties, which is
+        # about as fast as dict lookups in templates
+        self._row_class = make_row_class(columns)
+
+    @classmethod
+    def from_records(cls, records):
+        """Build a table from a list of polling place dicts."""
+        columns = {}
+        for field in FIELDS:
+            if field in NUMERIC_FIELDS:
+                columns[field] = array(NUMERIC_FIELDS[field], (r.get(field) or 0 for r in records))
+            elif field in CATEGORY_FIELDS:
+                columns[field] = CategoryColumn.from_values(r.get(field, '') for r in records)
+            else:
+                columns[field] = [r.get(field, '') for r in records]
+
+        # Many places share a name ("Lincoln Elementary School")
+        names = {}
+        columns['name'] = [names.setdefault(name, name) for name in columns['name']]
+
+        extras = {}
+        known = set(FIELDS)
+        for row, record in enumerate(records):
+            extra = {k: v for k, v in record.items() if k not in known}
+            if extra:
+                extras[row] = extra
+        return cls(columns, extras)
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        row_class = self._row_class
+        for row in range(self._size):
+            yield row_class(self, row)
+
+    def __getitem__(self, field):
+        return self.columns[field]
+
+    def value(self, field, row):
+        column = self.columns.get(field)
+        if column is not None:
+            return column[row]
+        extra = self.extras.get(row)
+        if extra is not None and field in extra:
+            return extra[field]
+        raise KeyError(field)
+
+    def row(self, row):
+        return self._row_class(self, row)
+
+    def row_of(self, place_id):
+        """Row number for a place ID, or None."""
+        if self._id_order is not None:
+            # Binary search the prebuilt ID order instead of building a dict
+            ids = self.columns['id']
+            position = bisect.bisect_left(self._id_order, place_id, key=ids.__getitem__)
+            if position < self._size and ids[self._id_order[position]] == place_id:
+                return self._id_order[position]
+            return None
+        if self._row_of is None:
+            self._row_of = {place_id: row for row, place_id in enumerate(self.columns['id'])}
+        return self._row_of.get(place_id)
+
+    def get(self, place_id):
+        """PlaceRow for a place ID, or None."""
+        row = self.row_of(place_id)
+        return None if row is None else self._row_class(self, row)
+
+    def record(self, row, **overrides):
+        """The place as a plain dict, as it appeared in the JSON."""
+        columns = self.columns
+        record = {field: columns[field][row] for field in FIELDS}
+        if row in self.extras:
+            record.update(self.extras[row])
+        record.update(overrides)
+        return record
+
+    def records(self, **extra_columns):
+        """
+        Every place as a plain dict, plus extra per-row columns.
+
+        Materializes each column once and zips them, which is much faster
+        than calling record() for every row.
+        """
+        names = FIELDS + tuple(extra_columns)
+        columns = [self.column_values(field) for field in FIELDS] + list(extra_columns.values())
+        records = [dict(zip(names, values)) for values in zip(*columns)]
+        for row, extra in self.extras.items():
+            records[row].update(extra)
+        return records
+
+    def column_values(self, field):
+        """A column as a plain list of values."""
+        column = self.columns[field]
+        if isinstance(column, CategoryColumn):
+            values = column.values
+            return [values[code] for code in column.codes]
+        return column.tolist() if hasattr(column, 'tolist') else column
+
+    def rows(self, rows):
+        row_class = self._row_class
+        return [row_class(self, row) for row in rows]
+
+    @property
+    def counties(self):
+        return sorted(self.columns['county'].values)
+
+    def county_rows(self, county):
+        """Rows in a county, in table order."""
+        if self._county_rows is None:
+            by_code = {}
+            for row, code in enumerate(self.columns['county'].codes):
+                by_code.setdefault(code, array('I')).append(row)
+            self._county_rows = by_code
+        code = self.columns['county'].code_of(county)
+        return self._county_rows.get(code, array('I'))
+
+    def order(self, field, reverse=False):
+        """Rows sorted by a field, stable like list.sort(), computed once."""
+        key = (field, reverse)
+        order = self._orders.get(key)
+        if order is None:
+            column = self.columns[field]
+            order = self._orders[key] = array('I', sorted(range(self._size), key=column.__getitem__, reverse=reverse))
+        return order
+
+    def rank(self, field, reverse=False):
+        """Position of each row in order(field, reverse)."""
+        key = (field, reverse)
+        rank = self._ranks.get(key)
+        if rank is None:
+            rank = array('I', [0]) * self._size
+            for position, row in enumerate(self.order(field, reverse)):
+                rank[row] = position
+            self._ranks[key] = rank
+        return rank
+
+    def id_order(self):
+        """Rows sorted by ID, for binary-search lookups."""
+        if self._id_order is None:
+            ids = self.columns['id']
+            self._id_order = array('I', sorted(range(self._size), key=ids.__getitem__))
+        return self._id_order
+
+    def warm(self):
+        """Compute every index now, e.g. before gunicorn forks its workers."""
+        self.county_rows('')
+        self.row_of('')
+        for field in SORT_FIELDS:
+            for reverse in (False, True):
+                self.rank(field, reverse)
+        self.search_index()
+
+    def search_index(self):
+        """
+        {field: (tokens, rows)} for each of SEARCH_FIELDS: every word of the
+        field, lower-cased and sorted, with the row it came from. Rows that
+        share a word are in name order. tokens is any sequence of strings
+        (a StringColumn when loaded from a snapshot).
+        """
+        if self._search_index is None:
+            name_rank = self.rank('name')
+            index = {}
+            for field in SEARCH_FIELDS:
+                column = self.columns[field]
+                if isinstance(column, CategoryColumn):
+                    words = [tokenize(value) for value in column.values]
+                    pairs = [(word, name_rank[row], row) for row, code in enumerate(column.codes) for word in words[code]]
+                else:
+                    pairs = [(word, name_rank[row], row) for row in range(self._size) for word in set(tokenize(column[row]))]
+                pairs.sort()
+                # Share one string object per distinct word
+                words = {}
+                index[field] = (
+                    [words.setdefault(word, word) for word, _, _ in pairs],
+                    array('I', [row for _, _, row in pairs]),
+                )
+            self._search_index = index
+        return self._search_index
+
+    def search(self, query, limit=10):
+        """
+        Rows whose name, city or county has words starting with every word
+        of the query, at most `limit` of them.
+
+        Name matches come first, then city and county matches, each in word
+        then name order. The longest query word is looked up in the prefix
+        index and the others are checked per candidate, so a query costs at
+        most MAX_SEARCH_SCAN index entries however many places there are.
+        """
+        words = tokenize(query)
+        if not words or limit <= 0:
+            return []
+        prefix = max(words, key=len)
+        others = [word for word in words if word != prefix]
+        index = self.search_index()
+
+        found = []
+        seen = set()
+        scanned = 0
+        for field in SEARCH_FIELDS:
+            tokens, rows = index[field]
+            position = bisect.bisect_left(tokens, prefix)
+            while position < len(tokens) and tokens[position].startswith(prefix):
+                row = rows[position]
+                position += 1
+                scanned += 1
+                if scanned > MAX_SEARCH_SCAN:
+                    return found
+                if row in seen:
+                    continue
+                if others:
+                    row_words = [w for field_name in SEARCH_FIELDS for w in tokenize(self.columns[field_name][row])]
+                    if not all(any(w.startswith(word) for w in row_words) for word in others):
+                        continue
+                seen.add(row)
+                found.append(row)
+                if len(found) == limit:
+                    return found
+        return found
+
+    def query(self, county='', risk_min=0, risk_max=100, sort_by=None, reverse=False):
+        """
+        Row numbers matching the polling_places_list filters, sorted.
+
+        Sorting by a field in SORT_FIELDS orders rows by their precomputed
+        rank, which gives the same result as sorting the filtered dicts.
+        Other values of sort_by leave the rows in table order.
+        """
+        risk = self.columns['risk_score']
+        candidates = self.county_rows(county) if county else range(self._size)
+        rows = [row for row in candidates if risk_min <= risk[row] <= risk_max]
+        if sort_by in SORT_FIELDS:
+            if len(rows) == self._size:
+                return list(self.order(sort_by, reverse))
+            rows.sort(key=self.rank(sort_by, reverse).__getitem__)
+        return rows
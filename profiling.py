@@ -0,0 +1,183 @@
+"""
+Opt-in cProfile sampling for slow requests.
+
+Profiling is off unless PROFILE_SAMPLE_RATE is set (a fraction between 0 and
+1 of requests to profile) or an admin adds ?profile=1 to a request. Sampled
+requests that take longer than PROFILE_THRESHOLD_MS, and every forced one,
+are written as .prof files (readable with pstats or snakeviz) to PROFILE_DIR,
+which is capped at PROFILE_MAX_FILES by deleting the oldest. Each profile
+has a small .json summary next to it (request, duration, top frames), and
+/admin/profiles lists the slowest of those. Since they are files in the
+shared PROFILE_DIR, the list covers every gunicorn worker.
+
+cProfile and pstats are only imported once a request is actually sampled.
+"""
+
+import io
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import datetime
+
+from flask import abort, current_app, g, jsonify, request, send_from_directory, session
+
+
+# Endpoints that are never sampled (they would only profile the profiler)
+SKIP_ENDPOINTS = {'metrics', 'health', 'static', 'admin_profiles', 'admin_profile_download'}
+
+TOP_FRAMES = 10
+
+
+def is_admin():
+    return session.get('user') in current_app.config['ADMIN_USERS']
+
+
+def top_frames(profiler, limit=TOP_FRAMES):
+    """The functions with the most internal time, as JSON-friendly dicts."""
+    import pstats
+
+    stats = pstats.Stats(profiler, stream=io.StringIO())
+    frames = []
+    for (filename, line, func), (_, calls, tottime, cumtime, _) in stats.stats.items():
+        frames.append({
+            'frame': f'{os.path.basename(filename)}:{line}({func})',
+            'calls': calls,
+            'tottime_ms': round(tottime * 1000, 3),
+            'cumtime_ms': round(cumtime * 1000, 3),
+        })
+    frames.sort(key=lambda f: f['tottime_ms'], reverse=True)
+    return frames[:limit]
+
+
+def summary_path(profile_path):
+    """Path of the JSON summary saved next to a .prof file."""
+    return profile_path[:-len('.prof')] + '.json'
+
+
+def rotate(directory, max_files):
+    """Delete the oldest profiles (and their summaries) so at most max_files remain."""
+    profiles = [os.path.join(directory, name) for name in os.listdir(directory) if name.endswith('.prof')]
+    if len(profiles) <= max_files:
+        return
+    # Another worker may be rotating at the same time
+    mtimes = {}
+    for path in profiles:
+        try:
+            mtimes[path] = os.path.getmtime(path)
+        except FileNotFoundError:
+            pass
+    profiles = sorted(mtimes, key=mtimes.get)
+    for path in profiles[:len(profiles) - max_files]:
+        for stale in (path, summary_path(path)):
+            try:
+                os.remove(stale)
+            except FileNotFoundError:
+                pass
+
+
+def recent_profiles(directory):
+    """Summaries of every saved profile, from all workers."""
+    if not os.path.isdir(directory):
+        return []
+    entries = []
+    for name in os.listdir(directory):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, name)) as f:
+                entries.append(json.load(f))
+        except FileNotFoundError:
+            continue
+    return entries
+
+
+def save_profile(profiler, duration):
+    """Write the profile to disk and remember it in the recent list."""
+    config = current_app.config
+    directory = config['PROFILE_DIR']
+    os.makedirs(directory, exist_ok=True)
+
+    started = datetime.utcnow()
+    filename = f"{started.strftime('%Y%m%dT%H%M%S%f')}-{request.endpoint}-{int(duration * 1000)}ms.prof"
+    path = os.path.join(directory, filename)
+    profiler.dump_stats(path)
+
+    entry = {
+        'file': filename,
+        'timestamp': started.isoformat() + 'Z',
+        'endpoint': request.endpoint,
+        'method': request.method,
+        'path': request.full_path.rstrip('?'),
+        'duration_ms': round(duration * 1000, 3),
+        'pid': os.getpid(),
+        'top_frames': top_frames(profiler),
+    }
+    # Written under a temporary name first so readers never see half of it
+    temporary = summary_path(path) + '.tmp'
+    with open(temporary, 'w') as f:
+        json.dump(entry, f)
+    os.replace(temporary, summary_path(path))
+    rotate(directory, config['PROFILE_MAX_FILES'])
+
+
+def init_app(app):
+    """Install the sampling hooks and admin endpoints on a Flask app."""
+    app.config.setdefault('ADMIN_USERS', {'admin'})
+    app.config.setdefault('PROFILE_SAMPLE_RATE', float(os.environ.get('PROFILE_SAMPLE_RATE', 0)))
+    app.config.setdefault('PROFILE_THRESHOLD_MS', float(os.environ.get('PROFILE_THRESHOLD_MS', 500)))
+    app.config.setdefault('PROFILE_DIR', os.environ.get('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'ep-profiles')))
+    app.config.setdefault('PROFILE_MAX_FILES', int(os.environ.get('PROFILE_MAX_FILES', 100)))
+
+    @app.before_request
+    def start_profiler():
+        if request.endpoint in SKIP_ENDPOINTS:
+            return
+        forced = request.args.get('profile') == '1' and is_admin()
+        rate = app.config['PROFILE_SAMPLE_RATE']
+        if not forced and not (rate > 0 and random.random() < rate):
+            return
+
+        import cProfile
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is already active (Python 3.12+ allows only one)
+            return
+        g.profiler = profiler
+        g.profile_forced = forced
+        g.profile_start = time.perf_counter()
+
+    @app.after_request
+    def stop_profiler(response):
+        profiler = g.pop('profiler', None)
+        if profiler is None:
+            return response
+        profiler.disable()
+        duration = time.perf_counter() - g.profile_start
+        if g.profile_forced or duration * 1000 >= app.config['PROFILE_THRESHOLD_MS']:
+            save_profile(profiler, duration)
+        return response
+
+    @app.route('/admin/profiles')
+    def admin_profiles():
+        """Slowest recent profiled requests with their top frames"""
+        if not is_admin():
+            abort(403)
+        limit = request.args.get('limit', 20, type=int)
+        entries = sorted(recent_profiles(app.config['PROFILE_DIR']), key=lambda e: e['duration_ms'], reverse=True)
+        return jsonify({
+            'sample_rate': app.config['PROFILE_SAMPLE_RATE'],
+            'threshold_ms': app.config['PROFILE_THRESHOLD_MS'],
+            'profiles': entries[:limit],
+        })
+
+    @app.route('/admin/profiles/<path:filename>')
+    def admin_profile_download(filename):
+        """Download a captured .prof file"""
+        if not is_admin():
+            abort(403)
+        return send_from_directory(app.config['PROFILE_DIR'], filename, as_attachment=True)
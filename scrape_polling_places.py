@@ -4,14 +4,14 @@ Scrape polling place data from Virginia Department of Elections website.
 
 The ELECT website provides Excel files with polling place information for each election.
 This script downloads and parses those files into our JSON format.
+
+The heavy dependencies are imported only by the steps that need them:
+requests to download, pandas to parse and geopy to geocode, so --help
+starts instantly and --preview never loads geopy.
 """
 
 import json
-import requests
-import pandas as pd
 from io import BytesIO
-from geopy.geocoders import Nominatim
-from geopy.exc import GeocoderTimedOut, GeocoderServiceError
 import time
 import os
 
@@ -29,11 +29,21 @@ class PollingPlaceScraper:
     """Scraper for Virginia polling place data."""
 
     def __init__(self):
-        self.geolocator = Nominatim(user_agent="csc-ep-tool/1.0")
+        self._geolocator = None
         self.geocode_cache = {}
 
+    @property
+    def geolocator(self):
+        """Nominatim client, created on first use."""
+        if self._geolocator is None:
+            from geopy.geocoders import Nominatim
+            self._geolocator = Nominatim(user_agent="csc-ep-tool/1.0")
+        return self._geolocator
+
     def download_excel(self, url):
         """Download Excel file from URL."""
+        import requests
+
         print(f"Downloading from {url}...")
         try:
             response = requests.get(url, timeout=30)
@@ -48,6 +58,8 @@ class PollingPlaceScraper:
         Geocode an address to get latitude/longitude.
         Uses caching to avoid repeated requests for the same address.
         """
+        from geopy.exc import GeocoderTimedOut, GeocoderServiceError
+
         # Create cache key
         full_address = f"{address}, {city}, {state}"
         if zip_code:
@@ -89,6 +101,8 @@ class PollingPlaceScraper:
         - City
         - Zip
         """
+        import pandas as pd
+
         try:
             # Try to read all sheets (sometimes data is in a specific sheet)
             excel_data = pd.ExcelFile(excel_file)
@@ -177,6 +191,8 @@ class PollingPlaceScraper:
             df: DataFrame with polling place data
             include_geocoding: If True, geocode addresses (slow!)
         """
+        import pandas as pd
+
         polling_places = []
 
         # Normalize column names
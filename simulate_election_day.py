@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+"""
+Simulate election-day report submissions and replay them against the app.
+
+Reports do not arrive uniformly: volunteers file most of them during the
+before-work and after-work rushes, and a problem at a high-risk polling place
+tends to produce a burst of follow-up reports from the same location. This
+script builds an arrival schedule from that model and replays it against a
+running app's /report endpoint with concurrent clients, recording throughput
+and latency percentiles.
+
+Examples:
+    # Show the hourly arrival profile without sending anything
+    python simulate_election_day.py --reports 5000 --dry-run
+
+    # Replay a full day in 14 minutes (60x) with 16 concurrent clients
+    python simulate_election_day.py --base-url http://localhost:8080 \\
+        --reports 5000 --speedup 60 --clients 16 --output results.json
+"""
+
+import argparse
+import bisect
+import json
+import math
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from generate_reports import (
+    ELECTION_DAY_START,
+    FIRST_NAMES,
+    ISSUE_TYPES,
+    LAST_NAMES,
+    generate_description,
+    generate_email,
+    generate_phone,
+)
+
+
+# Polls are modelled as open from 6am to 8pm
+DAY_START_HOUR = 6
+DAY_END_HOUR = 20
+
+# Daily shape of the arrival rate: (peak hour, width in hours, relative height).
+# A flat baseline of 1.0 is added to these peaks.
+ARRIVAL_PEAKS = [
+    (7.25, 1.0, 3.0),   # Before-work rush
+    (12.5, 0.75, 1.0),  # Lunch
+    (17.5, 1.25, 2.5),  # After-work rush
+]
+
+HIGH_RISK_THRESHOLD = 67
+
+
+def arrival_shape(hour):
+    """Relative report arrival rate at a given (fractional) hour of the day."""
+    rate = 1.0
+    for peak, width, height in ARRIVAL_PEAKS:
+        rate += height * math.exp(-0.5 * ((hour - peak) / width) ** 2)
+    return rate
+
+
+def mean_arrival_shape(steps=1000):
+    """Average of arrival_shape() over the polling day."""
+    span = DAY_END_HOUR - DAY_START_HOUR
+    total = sum(arrival_shape(DAY_START_HOUR + span * (i + 0.5) / steps) for i in range(steps))
+    return total / steps
+
+
+def generate_schedule(polling_places, reports=1000, burst_factor=1.5, burst_minutes=10.0, seed=None):
+    """
+    Build a day of report arrivals.
+
+    Primary reports follow a non-homogeneous Poisson process shaped by
+    ARRIVAL_PEAKS, scaled so that about `reports` of them arrive during the
+    day, and land on polling places in proportion to their risk score. Each
+    report at a high-risk place spawns a Poisson(burst_factor * risk / 100)
+    number of follow-ups at the same place, spaced by exponential delays with
+    a mean of `burst_minutes`.
+
+    Returns a list of events sorted by time, each a dict with `offset`
+    (seconds since polls opened) and the `form` fields to POST.
+    """
+    rng = random.Random(seed)
+    span_seconds = (DAY_END_HOUR - DAY_START_HOUR) * 3600
+
+    places = [p for p in polling_places if p.get("id")]
+    cum_weights = []
+    total_weight = 0
+    for place in places:
+        total_weight += max(place.get("risk_score", 0), 1)
+        cum_weights.append(total_weight)
+
+    # Thinning (Lewis-Shedler): sample a homogeneous process at the peak rate
+    # and keep each point with probability rate(t) / peak rate.
+    scale = reports / (span_seconds * mean_arrival_shape())
+    peak_rate = scale * max(arrival_shape(DAY_START_HOUR + h / 10) for h in range(141)) * 1.05
+    arrivals = []
+    t = 0.0
+    while peak_rate > 0:
+        t += rng.expovariate(peak_rate)
+        if t >= span_seconds:
+            break
+        rate = scale * arrival_shape(DAY_START_HOUR + t / 3600)
+        if rng.random() * peak_rate <= rate:
+            place = places[bisect.bisect_left(cum_weights, rng.random() * total_weight)]
+            arrivals.append((t, place, rng.choice(ISSUE_TYPES)))
+
+    # Correlated bursts at high-risk places
+    events = []
+    for t, place, issue_type in arrivals:
+        events.append((t, place, issue_type))
+        risk = place.get("risk_score", 0)
+        if risk < HIGH_RISK_THRESHOLD:
+            continue
+        follow_ups = poisson(rng, burst_factor * risk / 100)
+        follow_t = t
+        for _ in range(follow_ups):
+            follow_t += rng.expovariate(1 / (burst_minutes * 60))
+            if follow_t >= span_seconds:
+                break
+            # Follow-ups usually describe the same problem
+            follow_issue = issue_type if rng.random() < 0.7 else rng.choice(ISSUE_TYPES)
+            events.append((follow_t, place, follow_issue))
+
+    events.sort(key=lambda e: e[0])
+
+    schedule = []
+    for t, place, issue_type in events:
+        first_name = rng.choice(FIRST_NAMES)
+        last_name = rng.choice(LAST_NAMES)
+        schedule.append({
+            "offset": round(t, 3),
+            "form": {
+                "polling_place_id": place["id"],
+                "reporter_name": f"{first_name} {last_name}",
+                "reporter_email": generate_email(first_name, last_name),
+                "reporter_phone": generate_phone(),
+                "issue_type": issue_type,
+                "description": generate_description(issue_type),
+            },
+        })
+    return schedule
+
+
+def poisson(rng, lam):
+    """Draw from a Poisson distribution (Knuth's method, fine for small lambda)."""
+    limit = math.exp(-lam)
+    k = 0
+    p = rng.random()
+    while p > limit:
+        k += 1
+        p *= rng.random()
+    return k
+
+
+def hourly_profile(schedule):
+    """Count scheduled reports per hour of the polling day."""
+    counts = {}
+    for event in schedule:
+        hour = DAY_START_HOUR + int(event["offset"] // 3600)
+        counts[hour] = counts.get(hour, 0) + 1
+    return counts
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class Replayer:
+    """Replays a schedule against a running app with concurrent clients."""
+
+    def __init__(self, base_url, username="admin", password="demo", clients=8, timeout=30):
+        self.base_url = base_url.rstrip("/")
+        self.username = username
+        self.password = password
+        self.clients = clients
+        self.timeout = timeout
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.results = []
+
+    def session(self):
+        """Return this thread's logged-in session, logging in on first use."""
+        import requests
+
+        session = getattr(self.local, "session", None)
+        if session is None:
+            session = requests.Session()
+            response = session.post(
+                f"{self.base_url}/login",
+                data={"username": self.username, "password": self.password},
+                allow_redirects=False,
+                timeout=self.timeout,
+            )
+            if response.status_code != 302 or "session" not in session.cookies:
+                raise RuntimeError(f"Login failed with status {response.status_code}")
+            self.local.session = session
+        return session
+
+    def submit(self, event, scheduled_at):
+        """POST one report and record its latency and lag behind schedule."""
+        import requests
+
+        session = self.session()
+        started = time.perf_counter()
+        try:
+            response = session.post(
+                f"{self.base_url}/report",
+                data=event["form"],
+                allow_redirects=False,
+                timeout=self.timeout,
+            )
+            status = response.status_code
+        except requests.RequestException as e:
+            status = type(e).__name__
+        finished = time.perf_counter()
+
+        with self.lock:
+            self.results.append({
+                "offset": event["offset"],
+                "lag": started - scheduled_at,
+                "latency": finished - started,
+                "finished": finished,
+                "status": status,
+            })
+
+    def replay(self, schedule, speedup=60.0):
+        """Send every event at its scheduled (sped-up) time and summarize."""
+        self.results = []
+        with ThreadPoolExecutor(max_workers=self.clients) as pool:
+            # Log every client in before the clock starts
+            list(pool.map(lambda _: self.session(), range(self.clients)))
+
+            start = time.perf_counter()
+            for event in schedule:
+                scheduled_at = start + event["offset"] / speedup
+                delay = scheduled_at - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(self.submit, event, scheduled_at)
+        return summarize(self.results, start, speedup)
+
+
+def summarize(results, start, speedup):
+    """Compute throughput, latency percentiles and error counts."""
+    latencies = sorted(r["latency"] for r in results)
+    lags = sorted(r["lag"] for r in results)
+    errors = [r for r in results if r["status"] != 302]
+    elapsed = max((r["finished"] for r in results), default=start) - start
+
+    # Busiest simulated minute, to compare against the peak arrival rate
+    per_minute = {}
+    for r in results:
+        minute = int(r["offset"] // 60)
+        per_minute[minute] = per_minute.get(minute, 0) + 1
+    peak_minute, peak_count = max(per_minute.items(), key=lambda x: x[1], default=(0, 0))
+
+    def ms(value):
+        return None if value is None else round(value * 1000, 2)
+
+    return {
+        "requests": len(results),
+        "errors": len(errors),
+        "error_statuses": sorted({str(r["status"]) for r in errors}),
+        "elapsed_seconds": round(elapsed, 3),
+        "speedup": speedup,
+        "throughput_rps": round(len(results) / elapsed, 2) if elapsed > 0 else None,
+        "peak_minute": (ELECTION_DAY_START + timedelta(minutes=peak_minute)).strftime("%H:%M"),
+        "peak_minute_reports": peak_count,
+        "peak_offered_rps": round(peak_count * speedup / 60, 2),
+        "latency_ms": {
+            "p50": ms(percentile(latencies, 50)),
+            "p90": ms(percentile(latencies, 90)),
+            "p95": ms(percentile(latencies, 95)),
+            "p99": ms(percentile(latencies, 99)),
+            "max": ms(latencies[-1] if latencies else None),
+        },
+        "schedule_lag_ms": {
+            "p50": ms(percentile(lags, 50)),
+            "p99": ms(percentile(lags, 99)),
+        },
+    }
+
+
+def load_schedule(path):
+    """Load a schedule saved as JSON lines."""
+    with open(path, "r") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def save_schedule(schedule, path):
+    """Save a schedule as JSON lines."""
+    with open(path, "w") as f:
+        for event in schedule:
+            f.write(json.dumps(event) + "\n")
+
+
+def main():
+    """CLI interface for the simulator."""
+    parser = argparse.ArgumentParser(description="Simulate and replay election-day report submissions")
+    parser.add_argument("--places", default="data/polling_places.json", help="Polling places JSON file")
+    parser.add_argument("--reports", type=int, default=1000, help="Expected primary reports over the day (before bursts)")
+    parser.add_argument("--burst-factor", type=float, default=1.5, help="Mean follow-ups per report at a risk-100 place")
+    parser.add_argument("--burst-minutes", type=float, default=10.0, help="Mean minutes between follow-up reports")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for a reproducible schedule")
+    parser.add_argument("--schedule", help="Replay a saved schedule (JSON lines) instead of generating one")
+    parser.add_argument("--save-schedule", help="Write the schedule to this file (JSON lines)")
+    parser.add_argument("--dry-run", action="store_true", help="Print the arrival profile without sending requests")
+    parser.add_argument("--base-url", default="http://localhost:8080", help="App to replay against")
+    parser.add_argument("--username", default="admin", help="Login username")
+    parser.add_argument("--password", default="demo", help="Login password")
+    parser.add_argument("--speedup", type=float, default=60.0, help="Simulated seconds per wall-clock second")
+    parser.add_argument("--clients", type=int, default=8, help="Concurrent HTTP clients")
+    parser.add_argument("--output", help="Write the results summary to this JSON file")
+    args = parser.parse_args()
+
+    if args.schedule:
+        schedule = load_schedule(args.schedule)
+    else:
+        random.seed(args.seed)
+        with open(args.places, "r") as f:
+            polling_places = json.load(f)
+        schedule = generate_schedule(
+            polling_places,
+            reports=args.reports,
+            burst_factor=args.burst_factor,
+            burst_minutes=args.burst_minutes,
+            seed=args.seed,
+        )
+
+    if args.save_schedule:
+        save_schedule(schedule, args.save_schedule)
+        print(f"Saved {len(schedule)} events to {args.save_schedule}")
+
+    print(f"Schedule: {len(schedule)} reports")
+    profile = hourly_profile(schedule)
+    peak = max(profile.values(), default=0)
+    for hour in range(DAY_START_HOUR, DAY_END_HOUR):
+        count = profile.get(hour, 0)
+        bar = "#" * (round(40 * count / peak) if peak else 0)
+        print(f"  {hour:02d}:00 {count:6d} {bar}")
+
+    if args.dry_run:
+        return
+
+    wall_minutes = (DAY_END_HOUR - DAY_START_HOUR) * 60 / args.speedup
+    print(f"\nReplaying against {args.base_url} at {args.speedup:g}x "
+          f"(~{wall_minutes:.1f} minutes) with {args.clients} clients...")
+
+    replayer = Replayer(args.base_url, args.username, args.password, clients=args.clients)
+    summary = replayer.replay(schedule, speedup=args.speedup)
+
+    print(json.dumps(summary, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(summary, f, indent=2)
+        print(f"\nSaved results to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Compile the JSON data files into a binary snapshot for fast cold starts.
+
+The JSON files in data/ stay the editable source of truth. This build step
+packs them into data/snapshot.bin: every polling place column and every
+index the app would otherwise build at startup (sort orders, ranks, county
+rows, ID order, the place picker's word index) is stored as a raw array, so the app can mmap the file and
+use the arrays in place instead of parsing and sorting. Reports are stored
+with marshal, which loads far faster than JSON; marshal data is only
+readable by the Python version that wrote it, so the header records that
+version and a snapshot from another interpreter is ignored.
+
+Each section records a hash of the JSON file it was built from, and the app
+only uses a section whose source is unchanged; otherwise it parses the JSON
+as before. Rebuild after editing or regenerating the data:
+
+    python snapshot.py [--data-dir data]
+
+File layout: an 8-byte magic, a little-endian uint64 header length, a JSON
+header, then 8-byte aligned binary blobs addressed from the header by
+(offset, length) relative to the start of the blob section.
+"""
+
+import hashlib
+import json
+import marshal
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+
+from places import (
+    CATEGORY_FIELDS,
+    FIELDS,
+    NUMERIC_FIELDS,
+    SORT_FIELDS,
+    CategoryColumn,
+    PlaceTable,
+    StringColumn,
+)
+
+
+MAGIC = b'EPSNAP1\n'
+FORMAT_VERSION = 2
+SNAPSHOT_FILE = 'snapshot.bin'
+PLACES_FILE = 'polling_places.json'
+REPORTS_FILE = 'reports.json'
+
+
+def source_digest(path):
+    """Content hash identifying the JSON file a section was built from."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def align(offset):
+    return (offset + 7) & ~7
+
+
+class BlobWriter:
+    """Accumulates aligned binary blobs and records where each one lands."""
+
+    def __init__(self):
+        self.parts = []
+        self.size = 0
+
+    def add(self, data, typecode=None):
+        data = bytes(data)
+        padding = align(self.size) - self.size
+        if padding:
+            self.parts.append(b'\0' * padding)
+            self.size += padding
+        blob = {'offset': self.size, 'length': len(data)}
+        if typecode:
+            blob['typecode'] = typecode
+            blob['itemsize'] = array(typecode).itemsize
+        self.parts.append(data)
+        self.size += len(data)
+        return blob
+
+    def add_array(self, values, typecode):
+        return self.add(array(typecode, values).tobytes(), typecode)
+
+    def add_strings(self, values):
+        """Pack strings the way StringColumn reads them: offsets, then UTF-8 data."""
+        encoded = [value.encode('utf-8') for value in values]
+        offsets = [0]
+        for value in encoded:
+            offsets.append(offsets[-1] + len(value))
+        return {'offsets': self.add_array(offsets, 'Q'), 'data': self.add(b''.join(encoded))}
+
+
+def build(data_dir='data', output=None):
+    """Build the snapshot for data_dir and return its path."""
+    places_path = os.path.join(data_dir, PLACES_FILE)
+    reports_path = os.path.join(data_dir, REPORTS_FILE)
+    output = output or os.path.join(data_dir, SNAPSHOT_FILE)
+
+    with open(places_path, 'r') as f:
+        table = PlaceTable.from_records(json.load(f))
+    with open(reports_path, 'r') as f:
+        reports = json.load(f)
+    table.warm()
+
+    blobs = BlobWriter()
+    columns = {}
+    for field in FIELDS:
+        column = table.columns[field]
+        if field in NUMERIC_FIELDS:
+            columns[field] = {'kind': 'numeric', 'data': blobs.add(column.tobytes(), column.typecode)}
+        elif field in CATEGORY_FIELDS:
+            columns[field] = {
+                'kind': 'category',
+                'codes': blobs.add_array(column.codes, 'I'),
+                'values': column.values,
+            }
+        else:
+            columns[field] = dict(blobs.add_strings(column), kind='string')
+
+    indexes = {
+        'orders': [
+            [field, reverse, blobs.add_array(table.order(field, reverse), 'I'), blobs.add_array(table.rank(field, reverse), 'I')]
+            for field in SORT_FIELDS
+            for reverse in (False, True)
+        ],
+        'county_rows': [
+            [county, blobs.add_array(table.county_rows(county), 'I')]
+            for county in table.columns['county'].values
+        ],
+        'id_order': blobs.add_array(table.id_order(), 'I'),
+        'search': [
+            [field, blobs.add_strings(tokens), blobs.add(rows.tobytes(), rows.typecode)]
+            for field, (tokens, rows) in table.search_index().items()
+        ],
+    }
+
+    header = {
+        'version': FORMAT_VERSION,
+        'byteorder': sys.byteorder,
+        'marshal_version': marshal.version,
+        'python': list(sys.version_info[:2]),
+        'sources': {
+            PLACES_FILE: source_digest(places_path),
+            REPORTS_FILE: source_digest(reports_path),
+        },
+        'size': len(table),
+        'columns': columns,
+        'extras': [[row, extra] for row, extra in table.extras.items()],
+        'indexes': indexes,
+        'reports': blobs.add(marshal.dumps(reports)),
+    }
+    header_bytes = json.dumps(header).encode('utf-8')
+    prefix = MAGIC + struct.pack('<Q', len(header_bytes)) + header_bytes
+    prefix += b'\0' * (align(len(prefix)) - len(prefix))
+
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(output) or '.', prefix='.snapshot-', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(prefix)
+            for part in blobs.parts:
+                f.write(part)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, output)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return output
+
+
+class Snapshot:
+    """A memory-mapped snapshot file."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self.mm)
+        if bytes(view[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f'{path} is not a snapshot file')
+        (header_length,) = struct.unpack_from('<Q', view, len(MAGIC))
+        header_start = len(MAGIC) + 8
+        self.header = json.loads(bytes(view[header_start:header_start + header_length]))
+        if self.header['version'] != FORMAT_VERSION or self.header['byteorder'] != sys.byteorder:
+            raise ValueError(f'{path} was built for a different format or platform')
+        if self.header['marshal_version'] != marshal.version or self.header['python'] != list(sys.version_info[:2]):
+            raise ValueError(f'{path} was built by a different Python version')
+        self.blobs = view[align(header_start + header_length):]
+
+    def blob(self, spec):
+        data = self.blobs[spec['offset']:spec['offset'] + spec['length']]
+        typecode = spec.get('typecode')
+        if typecode is None:
+            return data
+        if array(typecode).itemsize != spec['itemsize']:
+            raise ValueError('snapshot was built with different array item sizes')
+        return data.cast(typecode)
+
+    def matches(self, name, path):
+        """Whether the section for `name` was built from the file at `path`."""
+        return self.header['sources'].get(name) == source_digest(path)
+
+    def places(self):
+        """A PlaceTable whose columns and indexes point into the mapping."""
+        columns = {}
+        for field, spec in self.header['columns'].items():
+            if spec['kind'] == 'numeric':
+                columns[field] = self.blob(spec['data'])
+            elif spec['kind'] == 'category':
+                columns[field] = CategoryColumn(self.blob(spec['codes']), spec['values'])
+            else:
+                columns[field] = StringColumn(self.blob(spec['offsets']), self.blob(spec['data']))
+
+        indexes = self.header['indexes']
+        orders = {}
+        ranks = {}
+        for field, reverse, order, rank in indexes['orders']:
+            orders[(field, reverse)] = self.blob(order)
+            ranks[(field, reverse)] = self.blob(rank)
+        county_codes = columns['county']
+        county_rows = {
+            county_codes.code_of(county): self.blob(rows)
+            for county, rows in indexes['county_rows']
+        }
+        return PlaceTable(
+            columns,
+            extras={row: extra for row, extra in self.header['extras']},
+            orders=orders,
+            ranks=ranks,
+            county_rows=county_rows,
+            id_order=self.blob(indexes['id_order']),
+            search_index={
+                field: (StringColumn(self.blob(tokens['offsets']), self.blob(tokens['data'])), self.blob(rows))
+                for field, tokens, rows in indexes['search']
+            },
+        )
+
+    def reports(self):
+        return marshal.loads(self.blob(self.header['reports']))
+
+
+def open_snapshot(data_dir):
+    """The snapshot in data_dir, or None if there is no usable one."""
+    path = os.path.join(data_dir, SNAPSHOT_FILE)
+    if not os.path.exists(path):
+        return None
+    try:
+        return Snapshot(path)
+    except (ValueError, KeyError, struct.error):
+        return None
+
+
+def main():
+    """CLI interface for building the snapshot."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compile data/*.json into a binary snapshot")
+    parser.add_argument("--data-dir", default="data", help="Directory with polling_places.json and reports.json")
+    parser.add_argument("--output", help="Snapshot path (default: <data-dir>/snapshot.bin)")
+    args = parser.parse_args()
+
+    path = build(args.data_dir, args.output)
+    snapshot = Snapshot(path)
+    print(f"Wrote {path} ({os.path.getsize(path):,} bytes): "
+          f"{snapshot.header['size']} polling places, {len(snapshot.reports())} reports")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,413 @@
+"""
+In-memory data store shared by the app's routes.
+
+Polling places and reports are parsed once and kept in memory (places in the
+columnar PlaceTable from places.py); a data file is
+only re-read when its size or modification time changes, so other gunicorn
+workers' report writes and re-scraped polling places are picked up on the
+next request. When gunicorn preloads the app, the master process loads the
+data before forking and every worker starts from that one copy. On the first
+load, sections of a prebuilt data/snapshot.bin whose JSON source is unchanged
+are memory-mapped instead of parsed (see snapshot.py).
+
+Reports live in two files: reports.json, the base list written by the data
+generators (and by save_reports), and reports.log, a JSON-lines log that
+committed batches are appended to. An append costs the size of the batch,
+not of the file, and a worker that sees the log grow reads only the new
+tail, so neither writing nor picking up a batch gets slower as the number
+of reports grows. Appends are serialized by a per-process lock plus an
+exclusive lock file shared by all workers; a reader ignores a last line
+that is not complete yet. Read-side caches can subscribe() to hear about
+every change to the reports.
+"""
+
+import bisect
+import json
+import logging
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+import ids
+import snapshot
+from places import PlaceTable
+
+try:
+    import fcntl
+except ImportError:  # Windows: only the per-process lock is available
+    fcntl = None
+
+
+logger = logging.getLogger(__name__)
+
+
+def file_stamp(path):
+    """Identify a version of a file cheaply: path, inode, size and mtime."""
+    st = os.stat(path)
+    return (path, st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+def log_stamp(path):
+    """(inode, size) of an append-only log, or None if it does not exist."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_size)
+
+
+def parse_log_lines(data, path):
+    """Reports from complete JSON lines, skipping (and logging) unreadable ones."""
+    lines = [line for line in data.splitlines() if line.strip()]
+    try:
+        # One parse for the whole block is much faster than one per line
+        return json.loads(b'[' + b','.join(lines) + b']')
+    except ValueError:
+        pass
+    reports = []
+    for line in lines:
+        try:
+            reports.append(json.loads(line))
+        except ValueError:
+            logger.warning('Skipping unreadable line in %s', path)
+    return reports
+
+
+REPORTS_FILE = 'reports.json'
+REPORTS_LOG = 'reports.log'
+
+
+class DataStore:
+    """Polling places and reports, loaded once and refreshed on change."""
+
+    def __init__(self, app=None):
+        self.app = None
+        self._lock = threading.RLock()
+        self._places_stamp = None
+        self._reports_stamp = None
+        # The part of reports.log that has been read: inode, bytes, and the
+        # log_stamp() seen when it was read
+        self._log_inode = None
+        self._log_offset = 0
+        self._log_stamp = None
+        self.places = PlaceTable.from_records([])
+        self.counties = []
+        self.reports = []
+        self.report_counts = {}
+        # {report ID: position in reports (commit order)}
+        self.report_positions = {}
+        self._report_order = None
+        self._listeners = []
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+
+    def path(self, filename):
+        return os.path.join(self.app.config['DATA_DIR'], filename)
+
+    def refresh(self):
+        """Reload any data file that changed since it was last read."""
+        places_path = self.path('polling_places.json')
+        reports_path = self.path(REPORTS_FILE)
+        places_stamp = file_stamp(places_path)
+        reports_stamp = file_stamp(reports_path)
+        current_log = log_stamp(self.path(REPORTS_LOG))
+        if places_stamp == self._places_stamp and reports_stamp == self._reports_stamp \
+                and current_log == self._log_stamp:
+            return
+
+        with self._lock:
+            # Only a fresh start can use the snapshot; once a file has been
+            # rewritten the snapshot is stale for it anyway
+            snap = None
+            if self._places_stamp is None or self._reports_stamp is None:
+                snap = snapshot.open_snapshot(self.app.config['DATA_DIR'])
+
+            if places_stamp != self._places_stamp:
+                if snap and self._places_stamp is None and snap.matches(snapshot.PLACES_FILE, places_path):
+                    places = snap.places()
+                else:
+                    with open(places_path, 'r') as f:
+                        places = PlaceTable.from_records(json.load(f))
+                self._set_places(places, places_stamp)
+
+            if reports_stamp == self._reports_stamp and current_log != self._log_stamp:
+                # Usually another worker appended a batch: read just the tail
+                if self._read_log_tail(current_log):
+                    return
+            if reports_stamp != self._reports_stamp or current_log != self._log_stamp:
+                if snap and self._reports_stamp is None and snap.matches(snapshot.REPORTS_FILE, reports_path):
+                    reports = snap.reports()
+                else:
+                    with open(reports_path, 'r') as f:
+                        reports = json.load(f)
+                self._log_inode, self._log_offset, self._log_stamp = None, 0, None
+                self._reports_stamp = reports_stamp
+                self._read_log_tail(current_log, reports)
+
+    def _read_log_tail(self, current_log, base=None):
+        """
+        Read reports.log from where the last read stopped and add what it
+        has. With `base` (a freshly read reports.json) the whole log is read
+        on top of it. Returns False, without reading, if the log was replaced
+        or truncated since, so that everything has to be read again.
+        """
+        path = self.path(REPORTS_LOG)
+        try:
+            with open(path, 'rb') as f:
+                inode = os.fstat(f.fileno()).st_ino
+                replaced = self._log_offset and inode != self._log_inode
+                if base is None and (replaced or os.fstat(f.fileno()).st_size < self._log_offset):
+                    return False
+                f.seek(self._log_offset)
+                data = f.read()
+        except FileNotFoundError:
+            if base is None and self._log_offset:
+                return False
+            inode, data = None, b''
+        # A batch still being appended ends without a newline; it is read
+        # once it is complete
+        complete = data.rfind(b'\n') + 1
+        added = parse_log_lines(data[:complete], path)
+        self._log_inode = inode
+        self._log_offset += complete
+        self._log_stamp = current_log
+        if base is not None:
+            self._set_reports(base + added)
+        elif added:
+            self._set_reports(self.reports + added, added)
+        return True
+
+    def reload(self):
+        """Re-read both data files even if they look unchanged."""
+        with self._lock:
+            self._places_stamp = None
+            self._reports_stamp = None
+            self._log_stamp = None
+            self.refresh()
+
+    def get(self):
+        """Current (places, reports). Callers must not mutate them."""
+        self.refresh()
+        return self.places, self.reports
+
+    @property
+    def version(self):
+        """
+        Identifies the loaded data. Built from the files' stamps and how
+        much of the report log was read, so it changes on every write and is
+        the same in every worker that has read the same data.
+        """
+        return self._places_stamp, self._reports_stamp, self._log_offset
+
+    def _set_places(self, places, stamp):
+        self.counties = places.counties
+        self.places = places
+        self._places_stamp = stamp
+
+    def _set_reports(self, reports, added=None):
+        """
+        Make `reports` the current list. `added` is what was appended to
+        the previous list, in which case the counts and positions are only
+        updated for those (readers only look entries up, so updating them
+        in place is safe); None rebuilds them.
+        """
+        if added is None:
+            report_counts = {}
+            for report in reports:
+                pp_id = report['polling_place_id']
+                report_counts[pp_id] = report_counts.get(pp_id, 0) + 1
+            self.report_counts = report_counts
+            self.report_positions = {report['id']: position for position, report in enumerate(reports)}
+        else:
+            report_counts, report_positions = self.report_counts, self.report_positions
+            for position, report in enumerate(added, len(reports) - len(added)):
+                pp_id = report['polling_place_id']
+                report_counts[pp_id] = report_counts.get(pp_id, 0) + 1
+                report_positions[report['id']] = position
+        self._report_order = self._extend_order(added) if added is not None else None
+        self.reports = reports
+        for listener in self._listeners:
+            # The reports are already written: a failing cache must not
+            # make the writer think the write failed
+            try:
+                listener(added)
+            except Exception:
+                logger.exception('Report listener %r failed', listener)
+
+    def _extend_order(self, added):
+        """The ID order with `added` merged in, if it has been built."""
+        if self._report_order is None:
+            return None
+        ordered, keys = list(self._report_order[0]), list(self._report_order[1])
+        for report in added:
+            key = ids.report_order_key(report)
+            position = bisect.bisect_right(keys, key)
+            keys.insert(position, key)
+            ordered.insert(position, report)
+        return ordered, keys
+
+    def report_order(self):
+        """(reports, keys): the reports sorted by ids.report_order_key, and their keys."""
+        self.refresh()
+        order = self._report_order
+        if order is None:
+            with self._lock:
+                if self._report_order is None:
+                    ordered = sorted(self.reports, key=ids.report_order_key)
+                    self._report_order = (ordered, [ids.report_order_key(r) for r in ordered])
+                order = self._report_order
+        return order
+
+    def reports_since(self, report_id):
+        """
+        Reports committed after report_id, in commit order (all of them if
+        it is unknown).
+
+        The cursor is the report's position in the list, not its ID: IDs
+        are minted when a report is submitted but batches are committed
+        later by each worker, so a report with a smaller ID can be
+        committed after one with a larger ID. Batches are only ever
+        appended to reports.log under write_lock, so anything committed
+        later comes after the cursor.
+        """
+        self.refresh()
+        reports = self.reports
+        position = self.report_positions.get(report_id)
+        if position is None:
+            return reports
+        return reports[position + 1:]
+
+    def subscribe(self, listener):
+        """
+        Call listener(added) whenever the reports change.
+
+        `added` is the list of reports appended, by this process or by another
+        worker (read from the tail of reports.log), or None when the whole
+        list was replaced. Listeners run with the store lock held, so they should be
+        quick; an exception from one is logged and does not fail the write.
+        """
+        self._listeners.append(listener)
+
+    @contextmanager
+    def write_lock(self):
+        """Serialize report writers across threads and worker processes."""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.path('reports.json.lock'), 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def save_reports(self, reports):
+        """Replace all reports: rewrite reports.json and empty reports.log."""
+        with self.write_lock():
+            path = self.path(REPORTS_FILE)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix='.reports-', suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(reports, f, indent=2)
+                os.chmod(tmp_path, 0o644)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+            # After the rename, so a crash in between can duplicate the
+            # logged reports but never lose them
+            try:
+                os.remove(self.path(REPORTS_LOG))
+            except FileNotFoundError:
+                pass
+            self._reports_stamp = file_stamp(path)
+            self._log_inode, self._log_offset, self._log_stamp = None, 0, None
+            self._set_reports(reports)
+
+    def add_report(self, report):
+        """Append one report, including any written by other workers."""
+        self.add_reports([report])
+        return report
+
+    def add_reports(self, reports):
+        """Append a batch of reports to reports.log with a single write."""
+        data = b''.join(json.dumps(report).encode('utf-8') + b'\n' for report in reports)
+        with self.write_lock():
+            # Other workers' batches come first in this process's list too
+            self.refresh()
+            path = self.path(REPORTS_LOG)
+            with open(path, 'ab') as f:
+                # A writer that died mid-append left a line without its
+                # newline; end it so this batch starts on a line of its own
+                if f.tell() != self._log_offset:
+                    data = b'\n' + data
+                f.write(data)
+                f.flush()
+                inode = os.fstat(f.fileno()).st_ino
+                end = f.tell()
+            self._log_inode, self._log_offset = inode, end
+            self._log_stamp = log_stamp(path)
+            self._set_reports(self.reports + reports, reports)
+
+
+class DerivedView:
+    """
+    Read-side state derived from a DataStore's places and reports.
+
+    Subclasses implement build(places, reports), returning the state, and
+    add(state, places, added), folding newly appended reports into it. The
+    state is built on first use, updated in place from the store's
+    subscribe() hook as batches are committed, and rebuilt when the reports
+    or places are replaced. changed() is called after either, for
+    subclasses that keep results computed from the state.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._lock = threading.Lock()
+        self._state = None
+        # The place table and report list the state was built from
+        self._places = None
+        self._source = None
+        store.subscribe(self._reports_added)
+
+    def build(self, places, reports):
+        raise NotImplementedError
+
+    def add(self, state, places, added):
+        raise NotImplementedError
+
+    def changed(self):
+        pass
+
+    def _reports_added(self, added):
+        with self._lock:
+            if self._state is None:
+                return
+            if added is None or self._places is not self.store.places:
+                self._state = None
+                return
+            # Skipped if the state was rebuilt from the new list already
+            if self._source is not self.store.reports:
+                self.add(self._state, self._places, added)
+                self._source = self.store.reports
+                self.changed()
+
+    def _current(self):
+        """The state, rebuilt if the data was replaced. Call with the lock held."""
+        places, reports = self.store.places, self.store.reports
+        if self._state is None or self._places is not places or self._source is not reports:
+            self._state = self.build(places, reports)
+            self._places, self._source = places, reports
+            self.changed()
+        return self._state
+
+    def warm(self):
+        """Build the state now; gunicorn.conf.py does this in the master."""
+        with self._lock:
+            self._current()
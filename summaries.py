@@ -0,0 +1,128 @@
+"""
+Precomputed county and state summaries.
+
+Coordinators want county totals (polling places, voters, average and maximum
+risk score, high-risk places, reports still open) without scanning every
+place and report per request. The place aggregates are computed in one pass
+over the columns whenever a new place table is loaded (a re-scrape replaces
+the whole table), and the report counts are kept up to date from the store's
+subscribe() hook as batches of reports are committed. The summary rows are
+rebuilt from those per-county totals, so their cost depends on the number
+of counties, not on the number of places or reports.
+
+The state level (the "region" above a county) adds up the county totals.
+"""
+
+from store import DerivedView
+
+HIGH_RISK_SCORE = 67  # Same cut-off as the "high" badge in the templates
+
+# Reports in any other status are still open
+CLOSED_STATUSES = ('resolved',)
+
+PLACE_TOTALS = ('polling_places', 'total_voters', 'risk_score_sum', 'max_risk_score', 'high_risk_places')
+REPORT_TOTALS = ('reports', 'open_reports')
+
+LEVELS = ('county', 'state')
+
+
+def summary_row(name_field, name, totals):
+    """Public summary fields for one county or state."""
+    places = totals['polling_places']
+    return {
+        name_field: name,
+        'polling_places': places,
+        'total_voters': totals['total_voters'],
+        'average_risk_score': round(totals['risk_score_sum'] / places, 1) if places else None,
+        'max_risk_score': totals['max_risk_score'] if places else None,
+        'high_risk_places': totals['high_risk_places'],
+        'reports': totals['reports'],
+        'open_reports': totals['open_reports'],
+    }
+
+
+class Summaries(DerivedView):
+    """
+    Per-county and per-state totals, kept in step with the store.
+
+    The state is ({county: {total name: value}}, {county: state}).
+    """
+
+    def __init__(self, store):
+        super().__init__(store)
+        # Summary rows by level, rebuilt after any change
+        self._rows = None
+
+    def _place_totals(self, places):
+        county_column = places['county']
+        codes, names = county_column.codes, county_column.values
+        totals = [dict.fromkeys(PLACE_TOTALS + REPORT_TOTALS, 0) for _ in names]
+        states = [None] * len(names)
+        state_column = places['state']
+        for row, (code, voters, risk) in enumerate(zip(codes, places['total_voters'], places['risk_score'])):
+            county = totals[code]
+            county['polling_places'] += 1
+            county['total_voters'] += voters
+            county['risk_score_sum'] += risk
+            if risk > county['max_risk_score']:
+                county['max_risk_score'] = risk
+            if risk >= HIGH_RISK_SCORE:
+                county['high_risk_places'] += 1
+            if states[code] is None:
+                states[code] = state_column[row]
+        return dict(zip(names, totals)), dict(zip(names, states))
+
+    def build(self, places, reports):
+        data = self._place_totals(places)
+        self.add(data, places, reports)
+        return data
+
+    def add(self, data, places, reports):
+        counties = places['county']
+        totals, _ = data
+        for report in reports:
+            row = places.row_of(report['polling_place_id'])
+            if row is None:
+                continue
+            county = totals[counties[row]]
+            county['reports'] += 1
+            if report.get('status') not in CLOSED_STATUSES:
+                county['open_reports'] += 1
+
+    def changed(self):
+        self._rows = None
+
+    def _summary_rows(self):
+        """Summary rows by level, rebuilding what changed. Call with the lock held."""
+        county_totals, county_state = self._current()
+        if self._rows is None:
+            states = {}
+            for county, totals in county_totals.items():
+                state = states.setdefault(county_state[county], dict.fromkeys(PLACE_TOTALS + REPORT_TOTALS, 0))
+                for name in PLACE_TOTALS + REPORT_TOTALS:
+                    if name == 'max_risk_score':
+                        state[name] = max(state[name], totals[name])
+                    else:
+                        state[name] += totals[name]
+                state['counties'] = state.get('counties', 0) + 1
+
+            county_rows = {}
+            for county in sorted(county_totals):
+                row = summary_row('county', county, county_totals[county])
+                row['state'] = county_state[county]
+                county_rows[county] = row
+            state_rows = {}
+            for state in sorted(states):
+                row = summary_row('state', state, states[state])
+                row['counties'] = states[state]['counties']
+                state_rows[state] = row
+            self._rows = {'county': county_rows, 'state': state_rows}
+        return self._rows
+
+    def rows(self, level='county'):
+        """{name: summary row} for every county or state, in name order."""
+        if level not in LEVELS:
+            raise ValueError(f'level must be one of {", ".join(LEVELS)}')
+        self.store.refresh()
+        with self._lock:
+            return self._summary_rows()[level]